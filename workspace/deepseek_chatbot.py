@@ -2,13 +2,23 @@ import arxiv
 import json
 import os
 import time
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import List, Tuple
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 import openai  # 使用OpenAI兼容的API调用DeepSeek
 
+# 与其他聊天机器人共用上下文预算、文件锁和 HTTP 连接池模块；
+# 脚本所在目录（workspace）在 sys.path 上，first_mcp_project 可作为命名空间包导入
+from first_mcp_project.context_budget import ContextBudget
+from first_mcp_project.llm_http import connection_stats, sync_client
+from first_mcp_project.topic_lock import TopicLockManager, atomic_write
+
 PAPER_DIR = "papers"
 
+# 同一轮的工具调用并行执行，同一主题的读改写要互斥
+topic_locks = TopicLockManager(PAPER_DIR)
+
 # Initialize FastMCP server
 mcp = FastMCP("research")
 
@@ -40,35 +50,36 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         papers = list(client.results(search))
         
         # Create directory for this topic
-        path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
+        topic_dir = topic.lower().replace(" ", "_")
+        path = os.path.join(PAPER_DIR, topic_dir)
         os.makedirs(path, exist_ok=True)
         
         file_path = os.path.join(path, "papers_info.json")
 
-        # Try to load existing papers info
-        try:
-            with open(file_path, "r", encoding='utf-8') as json_file:
-                papers_info = json.load(json_file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            papers_info = {}
-
-        # Process each paper and add to papers_info  
-        paper_ids = []
-        for paper in papers:
-            paper_id = paper.entry_id.split('/')[-1]
-            paper_ids.append(paper_id)
-            paper_info = {
-                'title': paper.title,
-                'authors': [author.name for author in paper.authors],
-                'summary': paper.summary,
-                'pdf_url': paper.pdf_url,
-                'published': str(paper.published.date()) if paper.published else 'Unknown'
-            }
-            papers_info[paper_id] = paper_info
-        
-        # Save updated papers_info to json file
-        with open(file_path, "w", encoding='utf-8') as json_file:
-            json.dump(papers_info, json_file, indent=2, ensure_ascii=False)
+        with topic_locks.lock(topic_dir):
+            # Try to load existing papers info
+            try:
+                with open(file_path, "r", encoding='utf-8') as json_file:
+                    papers_info = json.load(json_file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                papers_info = {}
+
+            # Process each paper and add to papers_info  
+            paper_ids = []
+            for paper in papers:
+                paper_id = paper.entry_id.split('/')[-1]
+                paper_ids.append(paper_id)
+                paper_info = {
+                    'title': paper.title,
+                    'authors': [author.name for author in paper.authors],
+                    'summary': paper.summary,
+                    'pdf_url': paper.pdf_url,
+                    'published': str(paper.published.date()) if paper.published else 'Unknown'
+                }
+                papers_info[paper_id] = paper_info
+            
+            # Save updated papers_info to json file; 并行的 extract_info 不会读到写了一半的文件
+            atomic_write(file_path, json.dumps(papers_info, indent=2, ensure_ascii=False).encode('utf-8'))
         
         print(f"成功搜索到 {len(papers)} 篇论文")
         print(f"结果保存在: {file_path}")
@@ -181,6 +192,126 @@ load_dotenv()
 # DeepSeek客户端将在process_query函数中初始化
 client = None
 
+# 流式输出：边生成边打印；LLM_STREAM=0 时等完整响应再打印
+STREAM = os.getenv("LLM_STREAM", "1") != "0"
+
+# 工具在线程池里并行执行（流式时在接收后续内容的同时就已开始运行）；TOOL_WORKERS 为最大并行数
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+tool_executor = ThreadPoolExecutor(max_workers=max(1, TOOL_WORKERS))
+
+def submit_tool(name: str, arguments: str) -> Future:
+    """Parse a tool call's JSON arguments and start it on tool_executor."""
+    try:
+        tool_args = json.loads(arguments or "{}")
+    except json.JSONDecodeError as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+    print(f"\n调用工具 {name} 参数: {tool_args}")
+    return tool_executor.submit(execute_tool, name, tool_args)
+
+def append_tool_turn(messages, content, tool_calls: List[dict], futures: List[Future]) -> None:
+    """
+    Record one assistant message carrying every tool call of the turn, then
+    one tool message per call, waiting for the results in call order.
+    """
+    messages.append({
+        "role": "assistant",
+        "content": content or None,
+        "tool_calls": [
+            {
+                "id": call["id"],
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"]
+                }
+            }
+            for call in tool_calls
+        ]
+    })
+    for call, future in zip(tool_calls, futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = f"工具 {call['name']} 执行出错: {e}"
+        messages.append({
+            "role": "tool",
+            "tool_call_id": call["id"],
+            "content": result
+        })
+
+def stream_completion(messages) -> Tuple[str, List[dict], List[Future]]:
+    """
+    Stream one chat completion, printing text deltas as they arrive.
+
+    tool_calls arrive as fragments keyed by index; a call is complete once a
+    fragment for a later index shows up (or the stream ends), and is then
+    submitted to tool_executor right away.
+
+    Returns:
+        (text content, assembled tool calls, one future per tool call)
+    """
+    stream = client.chat.completions.create(
+        model="deepseek-chat",
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        stream=True
+    )
+
+    content_parts = []
+    calls = {}    # index -> {"id", "name", "arguments"}
+    futures = {}  # index -> Future
+
+    def launch(index):
+        futures[index] = submit_tool(calls[index]["name"], calls[index]["arguments"])
+
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                print(delta.content, end="", flush=True)
+                content_parts.append(delta.content)
+            for fragment in delta.tool_calls or []:
+                if fragment.index not in calls:
+                    # 新的工具调用开始，前面的调用参数都已完整
+                    for index in calls:
+                        if index not in futures:
+                            launch(index)
+                    calls[fragment.index] = {"id": "", "name": "", "arguments": ""}
+                call = calls[fragment.index]
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function:
+                    call["name"] += fragment.function.name or ""
+                    call["arguments"] += fragment.function.arguments or ""
+    except BaseException:
+        # 流在中途断开时，已经提交的工具不能留在线程池里无人等待：未开始的取消，已在跑的等它结束
+        for future in futures.values():
+            future.cancel()
+        wait(futures.values())
+        raise
+
+    for index in calls:
+        if index not in futures:
+            launch(index)
+    if content_parts:
+        print()
+    order = sorted(calls)
+    return "".join(content_parts), [calls[i] for i in order], [futures[i] for i in order]
+
+def process_query_stream(messages, context):
+    while True:
+        content, tool_calls, futures = stream_completion(context.prepare(messages))
+        if not tool_calls:
+            break
+
+        # 一条 assistant 消息带上本轮全部 tool_calls，再逐个附上结果
+        append_tool_turn(messages, content, tool_calls, futures)
+
 def process_query(query):
     global client
     # 初始化DeepSeek客户端
@@ -192,74 +323,45 @@ def process_query(query):
         
         client = openai.OpenAI(
             api_key=api_key,
-            base_url="https://api.deepseek.com/v1"  # DeepSeek API端点
+            base_url="https://api.deepseek.com/v1",  # DeepSeek API端点
+            http_client=sync_client()  # 共用的 keep-alive 连接池
         )
     
     messages = [{'role': 'user', 'content': query}]
+    # 旧的工具结果超出预算时裁掉，只影响发送内容，不改 messages 本身
+    context = ContextBudget()
     
     try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",  # 使用DeepSeek Chat模型
-            messages=messages,
-            tools=tools,
-            tool_choice="auto"
-        )
-        
-        process_query = True
-        while process_query:
+        if STREAM:
+            process_query_stream(messages, context)
+            context.report()
+            return
+
+        while True:
+            response = client.chat.completions.create(
+                model="deepseek-chat",  # 使用DeepSeek Chat模型
+                messages=context.prepare(messages),
+                tools=tools,
+                tool_choice="auto"
+            )
             assistant_message = response.choices[0].message
             
             # 处理文本响应
             if assistant_message.content:
                 print(assistant_message.content)
             
-            # 处理工具调用
-            if assistant_message.tool_calls:
-                for tool_call in assistant_message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments)
-                    
-                    print(f"调用工具 {tool_name} 参数: {tool_args}")
-                    
-                    # 执行工具
-                    result = execute_tool(tool_name, tool_args)
-                    
-                    # 添加工具调用和结果到消息历史
-                    messages.append({
-                        "role": "assistant",
-                        "content": None,
-                        "tool_calls": [
-                            {
-                                "id": tool_call.id,
-                                "type": "function",
-                                "function": {
-                                    "name": tool_name,
-                                    "arguments": tool_call.function.arguments
-                                }
-                            }
-                        ]
-                    })
-                    
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": result
-                    })
-                    
-                    # 获取新的响应
-                    response = client.chat.completions.create(
-                        model="deepseek-chat",
-                        messages=messages,
-                        tools=tools,
-                        tool_choice="auto"
-                    )
-                    
-                    # 如果新响应只有文本，则处理并结束
-                    if response.choices[0].message.content and not response.choices[0].message.tool_calls:
-                        print(response.choices[0].message.content)
-                        process_query = False
-            else:
-                process_query = False
+            if not assistant_message.tool_calls:
+                break
+
+            # 本轮的工具调用全部并行执行，结果到齐后只再请求一次模型
+            tool_calls = [
+                {"id": tool_call.id, "name": tool_call.function.name, "arguments": tool_call.function.arguments}
+                for tool_call in assistant_message.tool_calls
+            ]
+            futures = [submit_tool(call["name"], call["arguments"]) for call in tool_calls]
+            append_tool_turn(messages, assistant_message.content, tool_calls, futures)
+
+        context.report()
                 
     except Exception as e:
         print(f"处理查询时出错: {e}")
@@ -289,4 +391,7 @@ def chat_loop():
             print(f"\n错误: {str(e)}")
 
 if __name__ == "__main__":
-    chat_loop()
+    try:
+        chat_loop()
+    finally:
+        connection_stats.report()
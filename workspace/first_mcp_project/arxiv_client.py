@@ -0,0 +1,184 @@
+import asyncio
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+from urllib.parse import urlencode
+
+import arxiv
+import feedparser
+import httpx
+
+# arXiv 要求两次 API 请求之间至少间隔 3 秒；离线基准测试可把 ARXIV_API_URL 指向本地桩服务并把间隔设为 0
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+ARXIV_DELAY_SECONDS = float(os.getenv("ARXIV_DELAY_SECONDS", "3.0"))
+ARXIV_NUM_RETRIES = 3
+
+# 批量搜索时同时在途的请求上限
+ARXIV_MAX_IN_FLIGHT = 4
+
+
+def _to_datetime(parsed: Optional[time.struct_time]) -> Optional[datetime]:
+    if not parsed:
+        return None
+    return datetime(*parsed[:6], tzinfo=timezone.utc)
+
+
+def _result_from_entry(entry) -> Optional[arxiv.Result]:
+    """
+    Build an arxiv.Result from one feedparser entry of an API response.
+
+    Only the public Result constructor is used, so this works across arxiv
+    package versions. Entries without an ID, title or publish date (arXiv
+    returns a single such entry for some errors) yield None.
+
+    Args:
+        entry: A feedparser entry from the Atom feed
+
+    Returns:
+        The result, or None if the entry is incomplete
+    """
+    if not entry.get("id") or not entry.get("title") or not entry.get("published_parsed"):
+        return None
+    published = _to_datetime(entry.published_parsed)
+    links = [
+        arxiv.Result.Link(link.href, title=link.get("title"), rel=link.get("rel"), content_type=link.get("type"))
+        for link in entry.get("links", [])
+    ]
+    return arxiv.Result(
+        entry_id=entry.id,
+        title=re.sub(r"\s+", " ", entry.title),
+        authors=[arxiv.Result.Author(author.name) for author in entry.get("authors", [])],
+        summary=entry.get("summary", ""),
+        comment=entry.get("arxiv_comment", ""),
+        journal_ref=entry.get("arxiv_journal_ref", ""),
+        doi=entry.get("arxiv_doi", ""),
+        primary_category=entry.get("arxiv_primary_category", {}).get("term", ""),
+        categories=[tag.get("term") for tag in entry.get("tags", [])],
+        links=links,
+        updated=_to_datetime(entry.get("updated_parsed")) or published,
+        published=published,
+    )
+
+
+class AsyncArxivClient:
+    """
+    Long-lived arXiv API client for async MCP tools.
+
+    Unlike arxiv.Client, which is synchronous and is usually created per call,
+    one instance keeps a pooled keep-alive httpx.AsyncClient for the whole
+    server lifetime. Feed parsing (feedparser is pure Python and slow on
+    large pages) runs in a worker thread so the event loop stays free.
+    """
+
+    def __init__(
+        self,
+        delay_seconds: float = ARXIV_DELAY_SECONDS,
+        num_retries: int = ARXIV_NUM_RETRIES,
+        api_url: str = ARXIV_API_URL,
+    ):
+        self.api_url = api_url
+        self.delay_seconds = delay_seconds
+        self.num_retries = num_retries
+        self._http: Optional[httpx.AsyncClient] = None
+        self._rate_lock = asyncio.Lock()
+        self._last_request = 0.0
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0),
+                headers={"user-agent": "first-mcp-project (arxiv.py compatible)"},
+                follow_redirects=True,
+            )
+        return self._http
+
+    def _format_url(self, search: arxiv.Search) -> str:
+        # 只用 Search 的公开属性拼查询参数，不依赖 arxiv 包的私有方法
+        url_args = {
+            "search_query": search.query,
+            "id_list": ",".join(search.id_list),
+            "sortBy": search.sort_by.value,
+            "sortOrder": search.sort_order.value,
+            "start": 0,
+            "max_results": search.max_results,
+        }
+        return f"{self.api_url}?{urlencode(url_args)}"
+
+    async def _wait_for_slot(self) -> None:
+        # 串行化请求的发起时间，遵守 arXiv 的礼貌间隔
+        async with self._rate_lock:
+            wait = self._last_request + self.delay_seconds - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_request = time.monotonic()
+
+    @staticmethod
+    def _parse(content: bytes) -> List[arxiv.Result]:
+        feed = feedparser.parse(content)
+        results = []
+        for entry in feed.entries:
+            result = _result_from_entry(entry)
+            if result is None:
+                print(f"跳过不完整的结果: {entry.get('id', '?')}", file=sys.stderr)
+                continue
+            results.append(result)
+        return results
+
+    async def search(self, search: arxiv.Search) -> List[arxiv.Result]:
+        """
+        Run an arXiv search without blocking the event loop.
+
+        Args:
+            search: The arxiv.Search to run (only its first page is fetched)
+
+        Returns:
+            List of arxiv.Result objects
+        """
+        url = self._format_url(search)
+        for try_index in range(self.num_retries + 1):
+            await self._wait_for_slot()
+            try:
+                response = await self.http.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                if try_index == self.num_retries:
+                    raise
+                continue
+            return await asyncio.to_thread(self._parse, response.content)
+        return []
+
+    async def search_many(
+        self, searches: List[arxiv.Search], max_in_flight: int = ARXIV_MAX_IN_FLIGHT
+    ) -> List[Union[List[arxiv.Result], Exception]]:
+        """
+        Run several searches pipelined under arXiv's rate limit.
+
+        Request starts are still spaced delay_seconds apart (FIFO, in the
+        order given), but a request does not wait for the previous response,
+        so total wall time is about len(searches) * delay_seconds plus one
+        response latency instead of the sum of all latencies.
+
+        Args:
+            searches: The searches to run
+            max_in_flight: Upper bound on concurrently open requests
+
+        Returns:
+            One entry per search: its results, or the exception it raised
+        """
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def run(search: arxiv.Search) -> List[arxiv.Result]:
+            async with semaphore:
+                return await self.search(search)
+
+        return await asyncio.gather(*(run(search) for search in searches), return_exceptions=True)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,370 @@
+"""
+Offline end-to-end benchmark of the chatbots' query loop.
+
+Starts a stub arXiv API (benchmarks/stub_arxiv.py) and a scripted fake LLM
+(benchmarks/fake_llm.py) in this process, then drives an existing chatbot
+against them in a scratch directory, so nothing touches the network or a
+paid API:
+
+    anthropic  mcp_chatbot_reference_server.MCP_ChatBot
+    deepseek   deepseek_chatbot.process_query, with its execute_tool
+               forwarded to the MCP session
+In both cases the research server is launched over stdio through
+benchmarks/instrumented_server.py.
+
+The default script has the model search arXiv for the query, then call
+extract_info for every returned paper in one turn, then answer.
+
+Stages (milliseconds, one sample per occurrence):
+    llm_wait          one LLM request, until the full response is received
+    tool_roundtrip    one call_tool as seen by the client
+    tool_dispatch     tool_roundtrip minus server_execution of the same call
+                      (stdio, JSON-RPC and scheduling overhead)
+    server_execution  the tool function inside the server
+    disk_io           paper store reads/writes inside the server
+    arxiv_fetch       request to the (stub) arXiv API
+    query_total       one whole process_query
+For each stage the report has count, mean, p50, p95, p99 and max. It is
+printed and saved as JSON; --compare prints the change against an earlier
+result file.
+
+Usage (from workspace/first_mcp_project):
+    python benchmarks/e2e_benchmark.py [--chatbot anthropic|deepseek] [--queries 20]
+        [--no-stream] [--ttft 0.3] [--arxiv-delay 0.05] [--output result.json]
+        [--compare old.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_llm import start_fake_llm  # noqa: E402
+from stub_arxiv import start_stub_arxiv  # noqa: E402
+
+STAGES = ("llm_wait", "tool_roundtrip", "tool_dispatch", "server_execution", "disk_io", "arxiv_fetch", "query_total")
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, dict]:
+    summary = {}
+    for stage in STAGES:
+        values = sorted(samples.get(stage, []))
+        if not values:
+            continue
+        summary[stage] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(values[-1], 3),
+        }
+    return summary
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.tool_calls: List[tuple] = []  # (name, arguments, ms)，用来和服务器端的计时配对
+
+    def add(self, stage: str, ms: float) -> None:
+        self.samples[stage].append(ms)
+
+
+# ---- anthropic: MCP chatbot + research server over stdio ----
+
+def timed_async(recorder: Recorder, stage: str, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            recorder.add(stage, (time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def timed_call_tool(recorder: Recorder, call_tool):
+    @functools.wraps(call_tool)
+    async def wrapper(name, arguments=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await call_tool(name, arguments=arguments, **kwargs)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            recorder.add("tool_roundtrip", ms)
+            recorder.tool_calls.append((name, arguments or {}, ms))
+    return wrapper
+
+
+def merge_server_timings(recorder: Recorder, timings_file: str) -> None:
+    """Add the server-side samples and derive tool_dispatch per matched call."""
+    if not os.path.exists(timings_file):
+        return
+    executions = []
+    with open(timings_file, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            recorder.add(entry["stage"], entry["ms"])
+            if entry["stage"] == "server_execution":
+                executions.append([entry["name"], json.loads(entry["args"] or "{}"), entry["ms"], False])
+    # 服务器端的参数补上了默认值，所以按“包含客户端参数”来配对
+    for name, arguments, roundtrip in recorder.tool_calls:
+        for execution in executions:
+            if execution[3] or execution[0] != name:
+                continue
+            if all(execution[1].get(key) == value for key, value in arguments.items()):
+                execution[3] = True
+                recorder.add("tool_dispatch", max(roundtrip - execution[2], 0.0))
+                break
+
+
+def research_server_config(args, workdir: str, arxiv_url: str, timings_file: str) -> dict:
+    """server_config.json entry that launches the instrumented research server."""
+    return {
+        "command": sys.executable,
+        "args": [os.path.join(BENCH_DIR, "instrumented_server.py")],
+        "cwd": workdir,
+        "env": {
+            "ARXIV_API_URL": arxiv_url,
+            "ARXIV_DELAY_SECONDS": "0",
+            "BENCH_TIMINGS_FILE": timings_file,
+            "BENCH_SERVER_MODULE": args.server,
+            "PAPER_STORE": os.getenv("PAPER_STORE", "json"),
+            "PYTHONPATH": PROJECT_DIR,
+        },
+    }
+
+
+async def run_anthropic(args, workdir: str, llm_url: str, arxiv_url: str, recorder: Recorder) -> None:
+    timings_file = os.path.join(workdir, "server_timings.jsonl")
+    config = {"mcpServers": {"research": research_server_config(args, workdir, arxiv_url, timings_file)}}
+    with open(os.path.join(workdir, "server_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    import mcp_chatbot_reference_server as chatbot_module
+    import tool_dispatch
+
+    tool_dispatch.stream_message = timed_async(recorder, "llm_wait", tool_dispatch.stream_message)
+    bot = chatbot_module.MCP_ChatBot()
+    bot.anthropic.messages.create = timed_async(recorder, "llm_wait", bot.anthropic.messages.create)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await bot.connect_to_servers()
+        if not bot.sessions:
+            raise RuntimeError("the research server did not start")
+        for session in bot.sessions:
+            session.call_tool = timed_call_tool(recorder, session.call_tool)
+
+        for i in range(args.queries):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                await bot.process_query(f"benchmark topic {i}")
+            recorder.add("query_total", (time.perf_counter() - start) * 1000)
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await bot.cleanup()
+    merge_server_timings(recorder, timings_file)
+
+
+# ---- deepseek: OpenAI-compatible chatbot, tools over stdio ----
+
+def timed_completions(recorder: Recorder, create):
+    @functools.wraps(create)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        response = create(*args, **kwargs)
+        if not kwargs.get("stream"):
+            recorder.add("llm_wait", (time.perf_counter() - start) * 1000)
+            return response
+
+        def chunks():
+            # 流式请求要等最后一个分片到达才算结束
+            try:
+                yield from response
+            finally:
+                recorder.add("llm_wait", (time.perf_counter() - start) * 1000)
+        return chunks()
+    return wrapper
+
+
+def run_deepseek(args, workdir: str, llm_url: str, arxiv_url: str, recorder: Recorder) -> None:
+    import openai
+
+    # deepseek_chatbot.py 在 first_mcp_project 的上一级，按包名导入共享模块
+    sys.path.insert(0, os.path.dirname(PROJECT_DIR))
+    import deepseek_chatbot
+    from first_mcp_project.llm_http import sync_client
+    from server_connections import ServerConnection
+
+    deepseek_chatbot.client = openai.OpenAI(api_key="bench", base_url=f"{llm_url}/v1", http_client=sync_client())
+    completions = deepseek_chatbot.client.chat.completions
+    completions.create = timed_completions(recorder, completions.create)
+
+    # 聊天机器人是同步的，工具在线程池里执行；MCP 会话放在单独线程的事件循环里，
+    # 和 anthropic 路径一样经 stdio 调用研究服务器
+    timings_file = os.path.join(workdir, "server_timings.jsonl")
+    connection = ServerConnection("research", research_server_config(args, workdir, arxiv_url, timings_file))
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, name="mcp-session", daemon=True)
+    loop_thread.start()
+
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    try:
+        run(connection.connect())
+        if connection.session is None:
+            raise RuntimeError(f"the research server did not start: {connection.error}")
+        call_tool = timed_call_tool(recorder, connection.session.call_tool)
+
+        def stdio_execute_tool(tool_name, tool_args):
+            result = run(call_tool(tool_name, arguments=tool_args))
+            return "\n".join(block.text for block in result.content if block.type == "text")
+
+        deepseek_chatbot.execute_tool = stdio_execute_tool
+        for i in range(args.queries):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                deepseek_chatbot.process_query(f"benchmark topic {i}")
+            recorder.add("query_total", (time.perf_counter() - start) * 1000)
+    finally:
+        run(connection.close())
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+    merge_server_timings(recorder, timings_file)
+
+
+# ---- report ----
+
+def print_report(result: dict, baseline: dict = None) -> None:
+    header = f"{'stage':<18}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    if baseline:
+        header += f"{'p50 Δ':>10}{'p95 Δ':>10}"
+    print(header)
+    for stage, row in result["stages"].items():
+        line = f"{stage:<18}{row['count']:>7}" + "".join(
+            f"{row[key]:>10.1f}" for key in ("mean", "p50", "p95", "p99", "max")
+        )
+        old = (baseline or {}).get("stages", {}).get(stage)
+        if old:
+            for key in ("p50", "p95"):
+                change = (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                line += f"{change:>+9.1f}%"
+        print(line)
+    print(f"\n{result['config']['queries']} queries in {result['wall_seconds']:.2f}s (times in ms)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chatbot", choices=("anthropic", "deepseek"), default="anthropic")
+    parser.add_argument("--server", default="research_server", help="research server module to launch")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--no-stream", action="store_true", help="use non-streaming LLM requests")
+    parser.add_argument("--ttft", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="fake LLM delay per streamed chunk (s)")
+    parser.add_argument("--arxiv-delay", type=float, default=0.05, help="stub arXiv response latency (s)")
+    parser.add_argument("--script", help="JSON script for the fake LLM (see benchmarks/fake_llm.py)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/e2e-<chatbot>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--verbose", action="store_true", help="show the chatbot's output")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    llm_server, llm_url = start_fake_llm(0, script, args.ttft, args.chunk_delay)
+    arxiv_server, arxiv_url = start_stub_arxiv(0, args.arxiv_delay)
+
+    # 模块在导入时读取这些环境变量，所以要先设置再导入聊天机器人
+    os.environ["ANTHROPIC_BASE_URL"] = llm_url
+    os.environ["ANTHROPIC_API_KEY"] = "bench"
+    os.environ["LLM_STREAM"] = "0" if args.no_stream else "1"
+    os.environ["MCP_LAZY_START"] = "0"
+
+    workdir = tempfile.mkdtemp(prefix="mcp-bench-")
+    cwd = os.getcwd()
+    output = args.output or os.path.join(
+        BENCH_DIR, "results", f"e2e-{args.chatbot}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output = os.path.abspath(output)
+    recorder = Recorder()
+    start = time.perf_counter()
+    try:
+        # 聊天机器人按相对路径读 server_config.json、写 papers/，全部放在临时目录里
+        os.chdir(workdir)
+        if args.chatbot == "anthropic":
+            asyncio.run(run_anthropic(args, workdir, llm_url, arxiv_url, recorder))
+        else:
+            run_deepseek(args, workdir, llm_url, arxiv_url, recorder)
+    finally:
+        os.chdir(cwd)
+        llm_server.shutdown()
+        arxiv_server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    wall = time.perf_counter() - start
+
+    result = {
+        "config": {
+            "chatbot": args.chatbot,
+            "server": args.server,
+            "queries": args.queries,
+            "stream": not args.no_stream,
+            "ttft": args.ttft,
+            "chunk_delay": args.chunk_delay,
+            "arxiv_delay": args.arxiv_delay,
+            "script": args.script or "default",
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "wall_seconds": round(wall, 3),
+        "stages": summarize(recorder.samples),
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
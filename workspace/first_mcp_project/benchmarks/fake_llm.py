@@ -0,0 +1,295 @@
+"""
+Scripted fake LLM endpoint speaking both the Anthropic Messages API
+(POST /v1/messages) and the OpenAI Chat Completions API
+(POST /v1/chat/completions), streaming and non-streaming.
+
+The reply to a request depends only on its conversation: the number of
+assistant messages so far selects the turn of the script. A turn has an
+optional "text" and a list of "tool_uses" ({"name", "input"}); in inputs,
+"{query}" is replaced by the first user message. A turn may also have
+"for_each_id": {"name": ..., "arg": ...}, which emits one tool call per
+arXiv ID found in the latest tool results. Past the end of the script the
+model answers with plain text. Latency is simulated as a fixed time to
+first token plus a delay per streamed chunk.
+
+Usage (from workspace/first_mcp_project):
+    python benchmarks/fake_llm.py [--port 8902] [--script script.json]
+and point a client at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8902
+(or base_url=http://127.0.0.1:8902/v1 for OpenAI clients).
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# 默认脚本：先搜索，再并行提取每篇论文的信息，最后给出总结
+DEFAULT_SCRIPT = [
+    {
+        "text": "Let me search arXiv for that.",
+        "tool_uses": [{"name": "search_papers", "input": {"topic": "{query}", "max_results": 5}}],
+    },
+    {
+        "text": "I found some papers, let me read them.",
+        "for_each_id": {"name": "extract_info", "arg": "paper_id"},
+    },
+]
+FINAL_TEXT = "Here is a summary of the papers I found. " * 8
+
+ID_PATTERN = re.compile(r"\d{4}\.\d{4,5}(?:v\d+)?")
+
+
+def _words(text: str) -> List[str]:
+    # 按词切分流式输出，保留空白
+    return re.findall(r"\S+\s*", text) or [text]
+
+
+class Turn:
+    """The scripted reply for one request: text plus (id, name, input) tool calls."""
+
+    def __init__(self, text: str, tool_calls: List[Tuple[str, str, dict]]):
+        self.text = text
+        self.tool_calls = tool_calls
+
+
+def plan_turn(script: list, messages: list) -> Turn:
+    assistant_turns = sum(1 for message in messages if message.get("role") == "assistant")
+    query = ""
+    for message in messages:
+        if message.get("role") == "user":
+            content = message.get("content")
+            query = content if isinstance(content, str) else " ".join(
+                block.get("text", "") for block in content if isinstance(block, dict)
+            )
+            break
+    if assistant_turns >= len(script):
+        return Turn(FINAL_TEXT, [])
+
+    step = script[assistant_turns]
+    calls = []
+    for i, tool_use in enumerate(step.get("tool_uses", [])):
+        arguments = json.loads(json.dumps(tool_use["input"]).replace("{query}", query.replace('"', "'")))
+        calls.append((f"call_{assistant_turns}_{i}", tool_use["name"], arguments))
+    if "for_each_id" in step:
+        # 从最近一条助手消息之后的工具结果里找 arXiv ID
+        last_assistant = max(i for i, message in enumerate(messages) if message.get("role") == "assistant")
+        recent = json.dumps(messages[last_assistant + 1:])
+        ids = list(dict.fromkeys(ID_PATTERN.findall(recent)))
+        name, arg = step["for_each_id"]["name"], step["for_each_id"]["arg"]
+        for paper_id in ids:
+            calls.append((f"call_{assistant_turns}_{len(calls)}", name, {arg: paper_id}))
+    if not calls:
+        return Turn(step.get("text") or FINAL_TEXT, [])
+    return Turn(step.get("text", ""), calls)
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    script: list = DEFAULT_SCRIPT
+    ttft = 0.3
+    chunk_delay = 0.005
+    requests = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    # ---- HTTP helpers ----
+
+    def _send_json(self, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _wait_chunks(self, count: int) -> None:
+        time.sleep(self.ttft + self.chunk_delay * count)
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests += 1
+        turn = plan_turn(self.script, body["messages"])
+        if self.path.endswith("/chat/completions"):
+            self._openai(body, turn)
+        elif self.path.endswith("/messages"):
+            self._anthropic(body, turn)
+        else:
+            self.send_error(404)
+
+    # ---- Anthropic ----
+
+    def _anthropic_usage(self, body: dict, output_tokens: int) -> dict:
+        input_tokens = len(json.dumps(body)) // 4
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        }
+
+    def _anthropic(self, body: dict, turn: Turn) -> None:
+        blocks = []
+        if turn.text:
+            blocks.append({"type": "text", "text": turn.text})
+        for call_id, name, arguments in turn.tool_calls:
+            blocks.append({"type": "tool_use", "id": call_id, "name": name, "input": arguments})
+        stop_reason = "tool_use" if turn.tool_calls else "end_turn"
+        output_tokens = len(json.dumps(blocks)) // 4
+        message = {
+            "id": f"msg_{self.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+        }
+        if not body.get("stream"):
+            self._wait_chunks(len(_words(turn.text)) + 2 * len(turn.tool_calls))
+            self._send_json(dict(message, content=blocks, usage=self._anthropic_usage(body, output_tokens)))
+            return
+
+        def event(name: str, data: dict) -> None:
+            self._chunk(f"event: {name}\ndata: {json.dumps(data)}\n\n")
+
+        self._start_stream()
+        time.sleep(self.ttft)
+        event("message_start", {
+            "type": "message_start",
+            "message": dict(message, content=[], stop_reason=None, usage=self._anthropic_usage(body, 1)),
+        })
+        for index, block in enumerate(blocks):
+            if block["type"] == "text":
+                event("content_block_start", {
+                    "type": "content_block_start", "index": index, "content_block": {"type": "text", "text": ""},
+                })
+                for word in _words(block["text"]):
+                    time.sleep(self.chunk_delay)
+                    event("content_block_delta", {
+                        "type": "content_block_delta", "index": index,
+                        "delta": {"type": "text_delta", "text": word},
+                    })
+            else:
+                event("content_block_start", {
+                    "type": "content_block_start", "index": index,
+                    "content_block": {"type": "tool_use", "id": block["id"], "name": block["name"], "input": {}},
+                })
+                arguments = json.dumps(block["input"])
+                for part in (arguments[:len(arguments) // 2], arguments[len(arguments) // 2:]):
+                    time.sleep(self.chunk_delay)
+                    event("content_block_delta", {
+                        "type": "content_block_delta", "index": index,
+                        "delta": {"type": "input_json_delta", "partial_json": part},
+                    })
+            event("content_block_stop", {"type": "content_block_stop", "index": index})
+        event("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": output_tokens},
+        })
+        event("message_stop", {"type": "message_stop"})
+        self._end_stream()
+
+    # ---- OpenAI ----
+
+    def _openai(self, body: dict, turn: Turn) -> None:
+        tool_calls = [
+            {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+            for call_id, name, arguments in turn.tool_calls
+        ]
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        base = {"id": f"chatcmpl-{self.requests}", "created": int(time.time()), "model": body.get("model", "fake")}
+        usage = {"prompt_tokens": len(json.dumps(body)) // 4, "completion_tokens": 1, "total_tokens": 0}
+        if not body.get("stream"):
+            self._wait_chunks(len(_words(turn.text)) + 2 * len(tool_calls))
+            message = {"role": "assistant", "content": turn.text or None}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._send_json(dict(
+                base, object="chat.completion", usage=usage,
+                choices=[{"index": 0, "message": message, "finish_reason": finish_reason}],
+            ))
+            return
+
+        def chunk(delta: dict, finish: Optional[str] = None) -> None:
+            data = dict(base, object="chat.completion.chunk",
+                        choices=[{"index": 0, "delta": delta, "finish_reason": finish}])
+            self._chunk(f"data: {json.dumps(data)}\n\n")
+
+        self._start_stream()
+        time.sleep(self.ttft)
+        chunk({"role": "assistant", "content": ""})
+        for word in _words(turn.text) if turn.text else []:
+            time.sleep(self.chunk_delay)
+            chunk({"content": word})
+        for index, call in enumerate(tool_calls):
+            arguments = call["function"]["arguments"]
+            time.sleep(self.chunk_delay)
+            chunk({"tool_calls": [{
+                "index": index, "id": call["id"], "type": "function",
+                "function": {"name": call["function"]["name"], "arguments": arguments[:len(arguments) // 2]},
+            }]})
+            time.sleep(self.chunk_delay)
+            chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[len(arguments) // 2:]}}]})
+        chunk({}, finish_reason)
+        self._chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+
+def start_fake_llm(
+    port: int = 0, script: Optional[list] = None, ttft: float = 0.3, chunk_delay: float = 0.005
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve the fake LLM from a daemon thread.
+
+    Returns:
+        (server, base URL, e.g. for ANTHROPIC_BASE_URL; OpenAI clients append /v1)
+    """
+    handler = type("Handler", (FakeLLMHandler,), {
+        "script": DEFAULT_SCRIPT if script is None else script,
+        "ttft": ttft,
+        "chunk_delay": chunk_delay,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--script", help="JSON file with the list of turns (default: search, then extract_info)")
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="seconds between streamed chunks")
+    args = parser.parse_args()
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    server, url = start_fake_llm(args.port, script, args.ttft, args.chunk_delay)
+    print(f"Fake LLM at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
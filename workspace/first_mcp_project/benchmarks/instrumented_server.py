@@ -0,0 +1,114 @@
+"""
+Research server with timing probes, launched over stdio by
+benchmarks/e2e_benchmark.py.
+
+Imports the server module named by BENCH_SERVER_MODULE (default
+research_server) and wraps, without changing behavior:
+    - every MCP tool function        -> stage "server_execution"
+    - the paper store's I/O methods  -> stage "disk_io" (outermost call only)
+    - arxiv_client.search            -> stage "arxiv_fetch"
+Each measurement is appended as one JSON line to BENCH_TIMINGS_FILE. The
+server then starts exactly like the module's own __main__ block.
+"""
+import functools
+import importlib
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STORE_METHODS = ("load", "add_papers", "get_paper", "list_topics", "get_topic_papers",
+                 "get_topic_page", "paper_count", "topic_summary")
+
+_write_lock = threading.Lock()
+_depth = threading.local()
+
+
+def record(stage: str, name: str, ms: float, args=None) -> None:
+    line = json.dumps({"stage": stage, "name": name, "ms": ms, "args": args}, default=str)
+    with _write_lock:
+        with open(os.environ["BENCH_TIMINGS_FILE"], "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def canonical_args(kwargs: dict) -> str:
+    # 与 e2e_benchmark.py 里客户端一侧的键保持一致，用来配对同一次调用
+    return json.dumps(kwargs, sort_keys=True, default=str)
+
+
+def timed_tool(name: str, fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record("server_execution", name, (time.perf_counter() - start) * 1000, canonical_args(kwargs))
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record("server_execution", name, (time.perf_counter() - start) * 1000, canonical_args(kwargs))
+    return wrapper
+
+
+def timed_store_method(name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        # 存储方法之间会互相调用，只记录最外层，免得重复计时
+        depth = getattr(_depth, "value", 0)
+        _depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _depth.value = depth
+            if depth == 0:
+                record("disk_io", name, (time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def timed_search(search):
+    @functools.wraps(search)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await search(*args, **kwargs)
+        finally:
+            record("arxiv_fetch", "search", (time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+def instrument(module) -> None:
+    for tool in module.mcp._tool_manager.list_tools():
+        tool.fn = timed_tool(tool.name, tool.fn)
+    for name in STORE_METHODS:
+        # 实例属性会覆盖类方法，模块里所有 store.xxx() 调用都会经过计时
+        setattr(module.store, name, timed_store_method(name, getattr(module.store, name)))
+    if hasattr(module, "arxiv_client"):
+        module.arxiv_client.search = timed_search(module.arxiv_client.search)
+
+
+def main() -> None:
+    module = importlib.import_module(os.getenv("BENCH_SERVER_MODULE", "research_server"))
+    instrument(module)
+    # 每个请求一行的 INFO 日志会刷满基准测试的终端
+    for logger in ("mcp", "httpx"):
+        logging.getLogger(logger).setLevel(logging.WARNING)
+    module.store.load()
+    if hasattr(module, "catalog"):
+        module.catalog.start()
+    module.mcp.run(transport="stdio")
+
+
+if __name__ == "__main__":
+    main()
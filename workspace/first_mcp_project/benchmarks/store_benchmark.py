@@ -0,0 +1,336 @@
+"""
+Storage microbenchmarks of the research server at synthetic scale.
+
+For each scale (topics:papers) a synthetic papers directory is generated
+with benchmarks/synthetic_store.py, then a fresh subprocess imports
+research_server_resources_and_prompt against it and times the server
+functions directly, without MCP or stdio in between:
+
+    open_store               module import, including open_store (1 round)
+    store_load_cold          first store.load(), i.e. building the index (1 round)
+    store_load_warm          store.load() with a current index
+    extract_info             random existing paper IDs
+    extract_info_missing     IDs that are not stored
+    get_topic_papers         first page of random topics, render cache cleared
+    get_topic_papers_largest first page of the largest topic, render cache cleared
+    catalog_build            first get_available_folders (1 round)
+    get_available_folders    render cache cleared
+    save_papers_merge        search_papers' merge-and-write of 5 new papers
+                             into the largest topic
+    save_papers_new_topic    the same into a new topic
+
+Like pytest-benchmark, each function runs for at least --min-rounds rounds
+and until --min-time has passed (at most --rounds), and the report shows
+min/max/mean/stddev/median in milliseconds. One extra round under
+tracemalloc gives the Python heap high-water mark per function, and the
+subprocess's peak RSS is reported per scale. Results are printed and saved
+as JSON; --compare prints the median change against an earlier file.
+
+Usage (from workspace/first_mcp_project):
+    python benchmarks/store_benchmark.py [--scales 10:1000,100:10000,1000:100000]
+        [--backend json|sqlite] [--data-dir DIR] [--output result.json] [--compare old.json]
+
+The 10k topics / 1M papers scale (--scales 10000:1000000) needs about 1.5 GB
+of disk; use --data-dir to generate it once and reuse it.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_store import generate, topic_name  # noqa: E402
+
+DEFAULT_SCALES = "10:1000,100:10000,1000:100000"
+SAMPLE_FILE = "sample_ids.json"
+SAMPLE_SIZE = 1000
+
+
+# ---- timing ----
+
+def run_benchmark(
+    fn: Callable[[object], object],
+    inputs: Iterator,
+    setup: Optional[Callable[[], None]] = None,
+    rounds: int = 50,
+    min_rounds: int = 3,
+    min_time: float = 0.5,
+) -> dict:
+    """Time fn over successive inputs, then measure its heap peak in one more round."""
+    times = []
+    started = time.perf_counter()
+    while len(times) < rounds and (len(times) < min_rounds or time.perf_counter() - started < min_time):
+        value = next(inputs)
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn(value)
+        times.append((time.perf_counter() - start) * 1000)
+
+    value = next(inputs)
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn(value)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "rounds": len(times),
+        "min": round(min(times), 4),
+        "max": round(max(times), 4),
+        "mean": round(statistics.fmean(times), 4),
+        "stddev": round(statistics.stdev(times), 4) if len(times) > 1 else 0.0,
+        "median": round(statistics.median(times), 4),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def single_round(fn: Callable[[], object]) -> dict:
+    """Time a one-off operation (cold start) together with its heap peak."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    elapsed = round(elapsed, 4)
+    return {"rounds": 1, "min": elapsed, "max": elapsed, "mean": elapsed, "stddev": 0.0,
+            "median": elapsed, "peak_kb": round(peak / 1024, 1)}
+
+
+def cycle(values: List) -> Iterator:
+    while True:
+        yield from values
+
+
+# ---- one scale, inside a subprocess ----
+
+def fake_results(prefix: str, count: int) -> list:
+    """arxiv.Result objects like the ones search_papers receives."""
+    import arxiv
+
+    results = []
+    for i in range(count):
+        pid = f"{prefix}.{i:05d}v1"
+        results.append(arxiv.Result(
+            entry_id=f"http://arxiv.org/abs/{pid}",
+            title=f"Benchmark paper {pid}",
+            authors=[arxiv.Result.Author("Bench Author")],
+            summary="Benchmark summary sentence. " * 45,
+            published=datetime.datetime(2025, 1, 1),
+            links=[arxiv.Result.Link(f"http://arxiv.org/pdf/{pid}", title="pdf")],
+        ))
+    return results
+
+
+def run_scale(workdir: str, args) -> dict:
+    """Benchmark the server functions against workdir/papers; called in a fresh process."""
+    os.chdir(workdir)
+    with open(SAMPLE_FILE, "r", encoding="utf-8") as f:
+        sample = json.load(f)
+    rng = random.Random(args.seed)
+    options = dict(rounds=args.rounds, min_rounds=args.min_rounds, min_time=args.min_time)
+    results: Dict[str, dict] = {}
+    holder = {}
+
+    def import_server():
+        # 服务器模块在导入时按相对路径打开 papers/
+        import research_server_resources_and_prompt
+        holder["module"] = research_server_resources_and_prompt
+
+    results["open_store"] = single_round(import_server)
+    server = holder["module"]
+    results["store_load_cold"] = single_round(server.store.load)
+    results["store_load_warm"] = run_benchmark(lambda _: server.store.load(), cycle([None]), **options)
+
+    loop = asyncio.new_event_loop()
+    ids = rng.sample(sample["ids"], min(len(sample["ids"]), 200))
+    results["extract_info"] = run_benchmark(
+        lambda pid: loop.run_until_complete(server.extract_info(pid)), cycle(ids), **options
+    )
+    missing = [f"0000.{i:05d}v9" for i in range(50)]
+    results["extract_info_missing"] = run_benchmark(
+        lambda pid: loop.run_until_complete(server.extract_info(pid)), cycle(missing), **options
+    )
+
+    clear_cache = server.resource_cache.invalidate
+    topics = [topic_name(rng.randrange(sample["topics"])) for _ in range(200)]
+    results["get_topic_papers"] = run_benchmark(server.get_topic_papers, cycle(topics), clear_cache, **options)
+    results["get_topic_papers_largest"] = run_benchmark(
+        server.get_topic_papers, cycle([topic_name(0)]), clear_cache, **options
+    )
+    results["catalog_build"] = single_round(server.get_available_folders)
+    results["get_available_folders"] = run_benchmark(
+        lambda _: server.get_available_folders(), cycle([None]), clear_cache, **options
+    )
+
+    batches = (fake_results(f"9{n:03d}", 5) for n in range(10_000))
+    results["save_papers_merge"] = run_benchmark(
+        lambda papers: server.save_papers(topic_name(0), papers), batches, **options
+    )
+    new_topics = ((f"benchmark new topic {n}", fake_results(f"8{n:03d}", 5)) for n in range(10_000))
+    results["save_papers_new_topic"] = run_benchmark(
+        lambda item: server.save_papers(item[0], item[1]), new_topics, **options
+    )
+    loop.close()
+    server.store.close()
+    return {
+        "benchmarks": results,
+        # Linux 上 ru_maxrss 的单位是 KB
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+# ---- driver ----
+
+def prepare_scale(base_dir: str, topics: int, papers: int, seed: int) -> dict:
+    """Generate (or reuse) the synthetic directory for one scale."""
+    workdir = os.path.join(base_dir, f"{topics}x{papers}")
+    paper_dir = os.path.join(workdir, "papers")
+    sample_path = os.path.join(workdir, SAMPLE_FILE)
+    if os.path.exists(sample_path):
+        return {"workdir": workdir, "generate_seconds": None, "reused": True}
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(f"Generating {topics} topics / {papers} papers...", file=sys.stderr)
+    start = time.perf_counter()
+    ids = generate(paper_dir, topics, papers, seed)
+    elapsed = time.perf_counter() - start
+    sample = random.Random(seed).sample(ids, min(len(ids), SAMPLE_SIZE))
+    # 样本文件最后写，它的存在表示目录已完整生成，可以复用
+    with open(sample_path, "w", encoding="utf-8") as f:
+        json.dump({"topics": topics, "papers": papers, "ids": sample}, f)
+    return {"workdir": workdir, "generate_seconds": round(elapsed, 2), "reused": False}
+
+
+def directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def print_report(result: dict, baseline: Optional[dict] = None) -> None:
+    old_scales = {scale["scale"]: scale for scale in (baseline or {}).get("scales", [])}
+    for scale in result["scales"]:
+        print(f"\n== {scale['topics']} topics / {scale['papers']} papers "
+              f"({scale['data_bytes'] / 1e6:.0f} MB on disk, peak RSS {scale['max_rss_kb'] / 1024:.0f} MB)")
+        header = (f"{'benchmark':<26}{'rounds':>7}{'min':>10}{'median':>10}{'mean':>10}"
+                  f"{'max':>10}{'stddev':>10}{'peak KB':>11}")
+        old = old_scales.get(scale["scale"], {}).get("benchmarks", {})
+        if old:
+            header += f"{'median Δ':>11}"
+        print(header)
+        for name, row in scale["benchmarks"].items():
+            line = f"{name:<26}{row['rounds']:>7}" + "".join(
+                f"{row[key]:>10.3f}" for key in ("min", "median", "mean", "max", "stddev")
+            ) + f"{row['peak_kb']:>11.1f}"
+            if name in old and old[name]["median"]:
+                line += f"{(row['median'] - old[name]['median']) / old[name]['median'] * 100:>+10.1f}%"
+            print(line)
+    print("\n(times in ms)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma separated topics:papers pairs")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--rounds", type=int, default=50, help="maximum rounds per benchmark")
+    parser.add_argument("--min-rounds", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.5, help="minimum seconds per benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", help="keep generated stores here and reuse them on later runs")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/store-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--run-scale", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale:
+        # 子进程：丢掉服务器模块的打印（例如每次 save_papers 的“结果保存在”），
+        # 免得终端输出算进计时；stdout 只留结果 JSON，出错时的 traceback 照常打印
+        with open(os.devnull, "w") as devnull, \
+                contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            result = run_scale(args.run_scale, args)
+        print(json.dumps(result))
+        return
+
+    base_dir = os.path.abspath(args.data_dir) if args.data_dir else tempfile.mkdtemp(prefix="store-bench-")
+    output = os.path.abspath(args.output or os.path.join(
+        BENCH_DIR, "results", f"store-{args.backend}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    ))
+    scales = []
+    try:
+        for spec in args.scales.split(","):
+            topics, papers = (int(part) for part in spec.split(":"))
+            prepared = prepare_scale(base_dir, topics, papers, args.seed)
+            data_bytes = directory_bytes(os.path.join(prepared["workdir"], "papers"))
+            if args.data_dir:
+                # 复用的目录会被 save_papers（以及 SQLite 导入）写入，先复制一份再测
+                workdir = tempfile.mkdtemp(prefix="store-bench-run-")
+                shutil.copytree(prepared["workdir"], workdir, dirs_exist_ok=True)
+            else:
+                workdir = prepared["workdir"]
+            print(f"Benchmarking {topics}:{papers} ({args.backend})...", file=sys.stderr)
+            env = dict(os.environ, PAPER_STORE=args.backend)
+            command = [sys.executable, os.path.abspath(__file__), "--run-scale", workdir,
+                       "--rounds", str(args.rounds), "--min-rounds", str(args.min_rounds),
+                       "--min-time", str(args.min_time), "--seed", str(args.seed)]
+            completed = subprocess.run(command, env=env, stdout=subprocess.PIPE, check=True)
+            measured = json.loads(completed.stdout.decode("utf-8").strip().splitlines()[-1])
+            scales.append({
+                "scale": spec,
+                "topics": topics,
+                "papers": papers,
+                "generate_seconds": prepared["generate_seconds"],
+                "data_bytes": data_bytes,
+                **measured,
+            })
+            if workdir != prepared["workdir"]:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    result = {
+        "config": {"backend": args.backend, "scales": args.scales, "rounds": args.rounds,
+                   "min_rounds": args.min_rounds, "min_time": args.min_time, "seed": args.seed},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "scales": scales,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    print(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Local stand-in for the arXiv query API, for offline benchmarks.
+
+Answers GET /api/query?search_query=...&max_results=... with an Atom feed
+of max_results deterministic entries (the IDs depend only on the query, so
+repeated runs store the same papers). An optional delay simulates network
+latency.
+
+Usage (from workspace/first_mcp_project):
+    python benchmarks/stub_arxiv.py [--port 8901] [--delay 0.2]
+and point the research server at it with
+    ARXIV_API_URL=http://127.0.0.1:8901/api/query ARXIV_DELAY_SECONDS=0
+"""
+import argparse
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "model training data learning neural network attention transformer graph "
+    "retrieval benchmark evaluation latency memory sparse dense optimization"
+).split()
+
+FEED_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<feed xmlns="http://www.w3.org/2005/Atom" '
+    'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+    'xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+    "<title>arXiv Query: {query}</title>\n"
+    "<opensearch:totalResults>{total}</opensearch:totalResults>\n"
+    "<opensearch:startIndex>0</opensearch:startIndex>\n"
+    "<opensearch:itemsPerPage>{total}</opensearch:itemsPerPage>\n"
+)
+
+ENTRY = (
+    "<entry>\n"
+    "<id>http://arxiv.org/abs/{paper_id}</id>\n"
+    "<updated>2025-01-01T00:00:00Z</updated>\n"
+    "<published>2025-01-01T00:00:00Z</published>\n"
+    "<title>{title}</title>\n"
+    "<summary>{summary}</summary>\n"
+    "<author><name>Author {a}</name></author>\n"
+    "<author><name>Author {b}</name></author>\n"
+    '<link href="http://arxiv.org/abs/{paper_id}" rel="alternate" type="text/html"/>\n'
+    '<link title="pdf" href="http://arxiv.org/pdf/{paper_id}" rel="related" type="application/pdf"/>\n'
+    '<arxiv:primary_category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>\n'
+    '<category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>\n'
+    "</entry>\n"
+)
+
+
+def paper_ids(query: str, count: int) -> list:
+    """The IDs the stub returns for a query, e.g. to predict them in a scripted LLM."""
+    seed = zlib.crc32(query.encode("utf-8"))
+    return [f"25{(seed >> 8) % 12 + 1:02d}.{(seed + i * 7919) % 100000:05d}v1" for i in range(count)]
+
+
+def render_feed(query: str, count: int) -> str:
+    parts = [FEED_HEAD.format(query=escape(query), total=count)]
+    for i, paper_id in enumerate(paper_ids(query, count)):
+        words = [WORDS[(i + j * 3) % len(WORDS)] for j in range(150)]
+        parts.append(ENTRY.format(
+            paper_id=paper_id,
+            title=escape(f"{query.title()} study {i + 1}"),
+            summary=escape(f"We study {query}. " + " ".join(words)),
+            a=i,
+            b=i + 1,
+        ))
+    parts.append("</feed>\n")
+    return "".join(parts)
+
+
+class StubArxivHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    requests = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        params = parse_qs(urlparse(self.path).query)
+        query = params.get("search_query", [""])[0]
+        count = min(int(params.get("max_results", ["10"])[0]), 200)
+        type(self).requests += 1
+        if self.delay:
+            time.sleep(self.delay)
+        body = render_feed(query, count).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_arxiv(port: int = 0, delay: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve the stub from a daemon thread.
+
+    Returns:
+        (server, API URL to use as ARXIV_API_URL)
+    """
+    handler = type("Handler", (StubArxivHandler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/query"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before each response")
+    args = parser.parse_args()
+    server, url = start_stub_arxiv(args.port, args.delay)
+    print(f"Stub arXiv API at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Generate a synthetic papers directory at a given scale.
+
+Writes PAPER_DIR/<topic>/papers_info.json in the same format search_papers
+produces, so the JSON store indexes it like real data (and the SQLite
+backend can import it through open_store). Topic sizes follow a Zipf-like
+skew: a few topics hold many papers, most hold a handful. Summaries are
+drawn from a pool of arXiv-length abstracts (about 700-1900 characters)
+plus a unique first sentence, which keeps file sizes realistic without
+spending minutes on random text.
+
+Usage (from workspace/first_mcp_project):
+    python benchmarks/synthetic_store.py OUT_DIR [--topics 10000] [--papers 1000000] [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+VOCABULARY = (
+    "we propose novel method model models learning neural network networks deep training data dataset "
+    "datasets benchmark benchmarks results show that our approach outperforms baseline baselines state "
+    "of the art attention transformer graph retrieval language large agents reinforcement policy reward "
+    "optimization gradient sparse dense representation representations embedding embeddings evaluation "
+    "task tasks performance efficient efficiency latency memory scalable robust robustness theoretical "
+    "analysis empirical experiments demonstrate significant improvements across multiple domains"
+).split()
+
+SUMMARY_POOL_SIZE = 512
+
+
+def topic_sizes(topics: int, papers: int, skew: float = 0.8) -> List[int]:
+    """Papers per topic, Zipf-like with every topic holding at least one paper."""
+    if papers < topics:
+        raise ValueError("need at least one paper per topic")
+    weights = [1.0 / (rank + 1) ** skew for rank in range(topics)]
+    total = sum(weights)
+    spare = papers - topics
+    sizes = [1 + int(spare * weight / total) for weight in weights]
+    # 取整丢掉的余数补给最大的几个主题
+    for i in range(papers - sum(sizes)):
+        sizes[i % topics] += 1
+    return sizes
+
+
+def summary_pool(rng: random.Random) -> List[str]:
+    pool = []
+    for _ in range(SUMMARY_POOL_SIZE):
+        length = min(max(int(rng.gauss(1200, 300)), 700), 1900)
+        words, size = [], 0
+        while size < length:
+            word = rng.choice(VOCABULARY)
+            words.append(word)
+            size += len(word) + 1
+        pool.append(" ".join(words).capitalize() + ".")
+    return pool
+
+
+def paper_id(n: int) -> str:
+    # 形如 arXiv 的 ID：年月 + 5 位序号
+    return f"{20 + n // 1_200_000 % 10}{n // 100_000 % 12 + 1:02d}.{n % 100_000:05d}v1"
+
+
+def topic_name(i: int) -> str:
+    return f"synthetic_topic_{i:05d}"
+
+
+def generate(paper_dir: str, topics: int, papers: int, seed: int = 1, verbose: bool = True) -> List[str]:
+    """
+    Write the synthetic store.
+
+    Returns:
+        Every generated paper ID, in topic order
+    """
+    rng = random.Random(seed)
+    pool = summary_pool(rng)
+    sizes = topic_sizes(topics, papers)
+    ids = []
+    n = 0
+    start = time.perf_counter()
+    for t, size in enumerate(sizes):
+        topic_dir = os.path.join(paper_dir, topic_name(t))
+        os.makedirs(topic_dir, exist_ok=True)
+        papers_info = {}
+        for _ in range(size):
+            pid = paper_id(n)
+            papers_info[pid] = {
+                "title": f"Synthetic study {n} of {topic_name(t).replace('_', ' ')}",
+                "authors": [f"Author {rng.randrange(50_000)}" for _ in range(rng.randint(1, 6))],
+                "summary": f"Paper {pid} examines topic {t}. " + pool[rng.randrange(SUMMARY_POOL_SIZE)],
+                "pdf_url": f"http://arxiv.org/pdf/{pid}",
+                "published": f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            }
+            ids.append(pid)
+            n += 1
+        with open(os.path.join(topic_dir, "papers_info.json"), "w", encoding="utf-8") as f:
+            json.dump(papers_info, f, indent=2, ensure_ascii=False)
+        if verbose and (t + 1) % max(topics // 10, 1) == 0:
+            print(f"  {t + 1}/{topics} topics, {n} papers ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+    return ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir", help="papers directory to create")
+    parser.add_argument("--topics", type=int, default=10_000)
+    parser.add_argument("--papers", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    generate(args.out_dir, args.topics, args.papers, args.seed)
+    print(f"Generated {args.papers} papers in {args.topics} topics under {args.out_dir} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
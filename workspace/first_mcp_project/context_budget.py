@@ -0,0 +1,171 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# 发给模型的上下文预算（估算 token 数），以及始终原样保留的最近工具结果个数
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+CONTEXT_KEEP_RECENT = int(os.getenv("CONTEXT_KEEP_RECENT", "2"))
+# 超出预算时一次裁到预算的这个比例以下，之后几轮只追加、不再改动前缀
+CONTEXT_ELIDE_TARGET = float(os.getenv("CONTEXT_ELIDE_TARGET", "0.6"))
+PREVIEW_CHARS = 160
+
+
+def _text(value: Any) -> str:
+    """Flatten message content (str, dicts, lists, SDK/MCP models) to text."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(_text(item) for item in value)
+    if isinstance(value, dict):
+        if "text" in value:
+            return str(value["text"])
+        return json.dumps(value, ensure_ascii=False, default=str)
+    text = getattr(value, "text", None)
+    if isinstance(text, str):
+        return text
+    if hasattr(value, "model_dump_json"):
+        return value.model_dump_json()
+    return str(value)
+
+
+def estimate_tokens(value: Any) -> int:
+    """
+    Rough token count without a tokenizer: about 4 bytes of UTF-8 per token,
+    which is close for English/JSON and errs high for CJK text.
+    """
+    return (len(_text(value).encode("utf-8")) + 3) // 4
+
+
+class ContextBudget:
+    """
+    Keeps the messages sent to the model under a token budget by eliding old
+    tool results.
+
+    The full history is kept; prepare() returns the list to send, in which
+    old tool results (never the most recent keep_recent) are replaced by a
+    short stub (tool name, original size, a preview). Works with both
+    Anthropic tool_result blocks and OpenAI role="tool" messages. One
+    instance is meant to live for one query.
+
+    Elision is kept stable for prompt caching (see with_cache_breakpoints):
+    a result that was elided once stays elided with the same stub, and when
+    the estimate exceeds the budget a whole batch of the oldest results is
+    elided at once, down to elide_target of the budget. Requests in between
+    only append to what was sent before, so the cached prefix up to the
+    previous request's last message stays byte-identical; only the request
+    that elides a new batch rewrites the prefix from its oldest newly elided
+    result on.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_TOKEN_BUDGET,
+        keep_recent: int = CONTEXT_KEEP_RECENT,
+        elide_target: float = CONTEXT_ELIDE_TARGET,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.elide_target = elide_target
+        self.saved_tokens = 0  # 本次查询所有请求累计省下的 token
+        self.requests = 0
+        self.elided: Dict[str, str] = {}  # tool_use_id -> stub，已裁掉的结果之后每次都裁成一样的内容
+
+    @staticmethod
+    def _tool_names(messages: List[dict]) -> Dict[str, str]:
+        names = {}
+        for message in messages:
+            if message.get("role") != "assistant":
+                continue
+            for call in message.get("tool_calls") or []:
+                names[call["id"]] = call["function"]["name"]
+            content = message.get("content")
+            if isinstance(content, list):
+                for block in content:
+                    block_type = block.get("type") if isinstance(block, dict) else getattr(block, "type", None)
+                    if block_type == "tool_use":
+                        block_id = block["id"] if isinstance(block, dict) else block.id
+                        names[block_id] = block["name"] if isinstance(block, dict) else block.name
+        return names
+
+    @staticmethod
+    def _tool_results(messages: List[dict]) -> List[Tuple[int, Optional[int], str, Any]]:
+        """(message index, block index or None, tool_use_id, content) in history order."""
+        results = []
+        for i, message in enumerate(messages):
+            if message.get("role") == "tool":
+                results.append((i, None, message["tool_call_id"], message.get("content")))
+            elif message.get("role") == "user" and isinstance(message.get("content"), list):
+                for j, block in enumerate(message["content"]):
+                    if isinstance(block, dict) and block.get("type") == "tool_result":
+                        results.append((i, j, block["tool_use_id"], block.get("content")))
+        return results
+
+    @staticmethod
+    def _stub(name: str, content: Any) -> str:
+        text = " ".join(_text(content).split())
+        preview = text[:PREVIEW_CHARS] + ("..." if len(text) > PREVIEW_CHARS else "")
+        return (
+            f"[Earlier {name} result elided to save context "
+            f"(~{estimate_tokens(content)} tokens); call the tool again if it is needed. "
+            f"Preview: {preview}]"
+        )
+
+    def prepare(self, messages: List[dict]) -> List[dict]:
+        """Return the messages to send for this request; the input list is not modified."""
+        self.requests += 1
+        total = sum(estimate_tokens(message.get("content")) for message in messages)
+        results = self._tool_results(messages)
+        candidates = results[:max(len(results) - self.keep_recent, 0)]
+        if not candidates or (total <= self.max_tokens and not self.elided):
+            return messages
+
+        names = self._tool_names(messages)
+        prepared = list(messages)
+        copied = set()
+
+        def elide(i: int, j: Optional[int], stub: str) -> None:
+            if i not in copied:
+                prepared[i] = dict(prepared[i])
+                if j is not None:
+                    prepared[i]["content"] = list(prepared[i]["content"])
+                copied.add(i)
+            if j is None:
+                prepared[i]["content"] = stub
+            else:
+                prepared[i]["content"][j] = dict(prepared[i]["content"][j], content=stub)
+
+        # 先原样重放之前裁过的，前缀与上一次请求保持一致
+        for i, j, tool_use_id, content in candidates:
+            if tool_use_id in self.elided:
+                elide(i, j, self.elided[tool_use_id])
+                saved = estimate_tokens(content) - estimate_tokens(self.elided[tool_use_id])
+                total -= saved
+                self.saved_tokens += saved
+
+        # 超出预算时一次裁掉一批，留出余量，后面几轮不用再改前缀
+        if total > self.max_tokens:
+            target = self.max_tokens * self.elide_target
+            for i, j, tool_use_id, content in candidates:
+                if total <= target:
+                    break
+                if tool_use_id in self.elided:
+                    continue
+                stub = self._stub(names.get(tool_use_id, "tool"), content)
+                saved = estimate_tokens(content) - estimate_tokens(stub)
+                if saved <= 0:
+                    continue
+                self.elided[tool_use_id] = stub
+                elide(i, j, stub)
+                total -= saved
+                self.saved_tokens += saved
+        return prepared
+
+    def report(self) -> None:
+        """Print how much context the elision saved over this query."""
+        if self.saved_tokens:
+            print(
+                f"[context] saved ~{self.saved_tokens} tokens over {self.requests} requests "
+                f"by eliding {len(self.elided)} old tool results (budget {self.max_tokens})"
+            )
@@ -0,0 +1,132 @@
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+# 所有 LLM 客户端共用的 HTTP 连接池配置
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") != "0"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+# httpx 默认空闲 5 秒就关闭连接，工具执行稍久一点下一次请求就得重新握手
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "600"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+
+
+class ConnectionStats:
+    """
+    Counts requests, new TCP connections and TLS handshakes through httpx's
+    "trace" request extension; every request that did not open a connection
+    reused a pooled one.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http2_responses = 0
+        self._lock = threading.Lock()
+
+    def on_event(self, event_name: str) -> None:
+        with self._lock:
+            if event_name == "connection.connect_tcp.complete":
+                self.new_connections += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+
+    def on_response(self, response: httpx.Response) -> None:
+        with self._lock:
+            self.requests += 1
+            if response.http_version == "HTTP/2":
+                self.http2_responses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(self.requests - self.new_connections, 0),
+                "tls_handshakes": self.tls_handshakes,
+                "http2_responses": self.http2_responses,
+            }
+
+    def report(self) -> None:
+        stats = self.stats()
+        if stats["requests"]:
+            print(
+                f"[http] {stats['requests']} LLM requests: {stats['new_connections']} new connections, "
+                f"{stats['reused_connections']} reused, {stats['tls_handshakes']} TLS handshakes, "
+                f"{stats['http2_responses']} over HTTP/2"
+            )
+
+
+connection_stats = ConnectionStats()
+
+
+def _http2_available() -> bool:
+    if not LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("h2 is not installed, LLM requests use HTTP/1.1 (pip install 'httpx[http2]')")
+        return False
+    return True
+
+
+def _client_kwargs() -> dict:
+    return dict(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        follow_redirects=True,
+    )
+
+
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+
+
+def async_client() -> httpx.AsyncClient:
+    """
+    The process-wide httpx.AsyncClient for AsyncAnthropic/AsyncOpenAI
+    (pass it as http_client=). Requests to the same host share its pool.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        async def trace(event_name: str, info: dict) -> None:
+            connection_stats.on_event(event_name)
+
+        async def add_trace(request: httpx.Request) -> None:
+            request.extensions["trace"] = trace
+
+        async def count_response(response: httpx.Response) -> None:
+            connection_stats.on_response(response)
+
+        _async_client = httpx.AsyncClient(
+            event_hooks={"request": [add_trace], "response": [count_response]},
+            **_client_kwargs(),
+        )
+    return _async_client
+
+
+def sync_client() -> httpx.Client:
+    """The process-wide httpx.Client for the synchronous SDK clients."""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        def trace(event_name: str, info: dict) -> None:
+            connection_stats.on_event(event_name)
+
+        def add_trace(request: httpx.Request) -> None:
+            request.extensions["trace"] = trace
+
+        _sync_client = httpx.Client(
+            event_hooks={"request": [add_trace], "response": [connection_stats.on_response]},
+            **_client_kwargs(),
+        )
+    return _sync_client
@@ -0,0 +1,33 @@
+import os
+from typing import Any, Callable
+
+# 流式输出：边生成边打印；LLM_STREAM=0 时等完整响应再打印
+STREAM = os.getenv("LLM_STREAM", "1") != "0"
+
+
+async def stream_message(client, on_tool_use: Callable[[Any], None], **params):
+    """
+    Stream one Anthropic messages request.
+
+    Text deltas are printed as they arrive. Each tool_use block is handed to
+    on_tool_use as soon as its content_block_stop event arrives, i.e. once
+    its input JSON is complete, while later blocks are still streaming.
+
+    Returns:
+        The final Message, same as messages.create would
+    """
+    printed = False
+    async with client.messages.stream(**params) as stream:
+        async for event in stream:
+            if event.type == "text":
+                print(event.text, end="", flush=True)
+                printed = True
+            elif event.type == "content_block_stop" and event.content_block.type == "tool_use":
+                if printed:
+                    print()
+                    printed = False
+                on_tool_use(event.content_block)
+        message = await stream.get_final_message()
+    if printed:
+        print()
+    return message
@@ -0,0 +1,118 @@
+import heapq
+import math
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from paper_store import PaperStore
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# 只去掉最常见的英文虚词，其余交给 IDF
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were with we our".split()
+)
+
+# 标题比摘要更能代表论文主题，计入两次
+TITLE_WEIGHT = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over title, summary and authors of stored papers.
+
+    Built once from the papers store on first use and updated incrementally
+    by add_papers() whenever search_papers writes, so search() never touches
+    the disk or the network.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {paper_id: tf}
+        self.doc_terms: Dict[str, Counter] = {}       # paper_id -> term counts
+        self.doc_len: Dict[str, int] = {}
+        self.total_len = 0
+        self.built = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _document(info: dict) -> List[str]:
+        title = tokenize(info.get("title", ""))
+        return (
+            title * TITLE_WEIGHT
+            + tokenize(info.get("summary", ""))
+            + tokenize(" ".join(info.get("authors", [])))
+        )
+
+    def _remove(self, paper_id: str) -> None:
+        terms = self.doc_terms.pop(paper_id, None)
+        if terms is None:
+            return
+        self.total_len -= self.doc_len.pop(paper_id)
+        for term in terms:
+            docs = self.postings[term]
+            del docs[paper_id]
+            if not docs:
+                del self.postings[term]
+
+    def _add(self, paper_id: str, info: dict) -> None:
+        self._remove(paper_id)
+        terms = Counter(self._document(info))
+        self.doc_terms[paper_id] = terms
+        self.doc_len[paper_id] = sum(terms.values())
+        self.total_len += self.doc_len[paper_id]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[paper_id] = tf
+
+    def add_papers(self, papers: Dict[str, dict]) -> None:
+        """Index new or updated papers (paper_id -> info)."""
+        with self._lock:
+            if not self.built:
+                # 尚未建立索引时不必增量更新，首次查询会完整构建
+                return
+            for paper_id, info in papers.items():
+                self._add(paper_id, info)
+
+    def build(self, store: PaperStore) -> None:
+        """(Re)build the index from every topic in the store."""
+        with self._lock:
+            self.postings, self.doc_terms, self.doc_len, self.total_len = {}, {}, {}, 0
+            for topic in store.list_topics():
+                try:
+                    papers = store.get_topic_papers(topic) or {}
+                except ValueError as e:
+                    print(f"Error indexing topic {topic}: {str(e)}", file=sys.stderr)
+                    continue
+                for paper_id, info in papers.items():
+                    self._add(paper_id, info)
+            self.built = True
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank stored papers against a free-text query.
+
+        Returns:
+            Up to k (paper_id, score) pairs, best first
+        """
+        with self._lock:
+            n = len(self.doc_terms)
+            if n == 0:
+                return []
+            avg_len = self.total_len / n
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for paper_id, tf in docs.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_len[paper_id] / avg_len)
+                    scores[paper_id] = scores.get(paper_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -1,12 +1,12 @@
 from dotenv import load_dotenv
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 from typing import List
 import asyncio
-import nest_asyncio
-
-nest_asyncio.apply()
+from llm_http import async_client, connection_stats
+from tool_cache import ToolCache
+from tool_dispatch import run_turns
 
 load_dotenv()
 
@@ -19,68 +19,31 @@ class MCP_ChatBot:
         """初始化聊天机器人的基本属性"""
         # Initialize session and client objects
         self.session: ClientSession = None  # 用于与工具服务器的会话
-        self.anthropic = Anthropic()  # Anthropic API客户端
+        self.anthropic = AsyncAnthropic(http_client=async_client())  # Anthropic API客户端
         self.available_tools: List[dict] = []  # 可用工具列表
+        self.tool_cache = ToolCache()  # 幂等工具调用的结果缓存，/cache 查看命中情况
 
     async def process_query(self, query):
         messages = [{'role':'user', 'content':query}]
-        response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'deepseek-chat', 
-                                      tools = self.available_tools, # tools exposed to the LLM
-                                      messages = messages)
-        process_query = True
-        while process_query:
-            assistant_content = []
-            for content in response.content:
-                if content.type =='text':
-                    print(content.text)
-                    assistant_content.append(content)
-                    if(len(response.content) == 1):
-                        process_query= False
-                elif content.type == 'tool_use':
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    tool_id = content.id
-                    tool_args = content.input
-                    tool_name = content.name
-    
-                    print(f"Calling tool {tool_name} with args {tool_args}")
-                    
-                    # Call a tool
-                    # result = execute_tool(tool_name, tool_args): not anymore needed
-                    # tool invocation through the client session
-                    result = await self.session.call_tool(tool_name, arguments=tool_args)
-                    messages.append({"role": "user", 
-                                      "content": [
-                                          {
-                                              "type": "tool_result",
-                                              "tool_use_id":tool_id,
-                                              "content": result.content
-                                          }
-                                      ]
-                                    })
-                    response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'deepseek-chat', 
-                                      tools = self.available_tools,
-                                      messages = messages) 
-                    
-                    if(len(response.content) == 1 and response.content[0].type == "text"):
-                        print(response.content[0].text)
-                        process_query= False
+        await run_turns(self.anthropic, lambda name: self.session, self.available_tools, self.tool_cache, messages)
 
-    
     """ 循环调用 process_query，处理用户输入的查询 """
     async def chat_loop(self):
         """Run an interactive chat loop"""
         print("\nMCP Chatbot Started!")
         print("Type your queries or 'quit' to exit.")
+        print("Use /cache to show tool cache statistics.")
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
         
                 if query.lower() == 'quit':
                     break
+
+                if query.lower() == '/cache':
+                    self.tool_cache.print_stats()
+                    continue
                     
                 await self.process_query(query)
                 print("\n")
@@ -119,7 +82,11 @@ class MCP_ChatBot:
 
 async def main():
     chatbot = MCP_ChatBot()
-    await chatbot.connect_to_server_and_run()
+    try:
+        await chatbot.connect_to_server_and_run()
+    finally:
+        await chatbot.anthropic.close()
+        connection_stats.report()
   
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,11 +1,15 @@
 from dotenv import load_dotenv
-from anthropic import Anthropic
-from mcp import ClientSession, StdioServerParameters, types
-from mcp.client.stdio import stdio_client
+from anthropic import AsyncAnthropic
+from mcp import ClientSession, types
+from server_connections import LazySession, connect_all, print_startup_report
 from typing import List, Dict, TypedDict
 from contextlib import AsyncExitStack
 import json
+import time
 import asyncio
+from llm_http import async_client, connection_stats
+from tool_cache import ToolCache
+from tool_dispatch import run_turns
 
 load_dotenv()
 
@@ -20,113 +24,79 @@ class MCP_ChatBot:
         # 初始化会话和客户端对象
         self.sessions: List[ClientSession] = [] # new
         self.exit_stack = AsyncExitStack() # new
-        self.anthropic = Anthropic()
+        self.anthropic = AsyncAnthropic(http_client=async_client())
         self.available_tools: List[ToolDefinition] = [] # new
         self.tool_to_session: Dict[str, ClientSession] = {} # new
+        # 幂等工具调用的结果缓存，/cache 查看命中情况
+        self.tool_cache = ToolCache()
 
 
-    async def connect_to_server(self, server_name: str, server_config: dict) -> None:
-        """Connect to a single MCP server."""
-        try:
-            server_params = StdioServerParameters(**server_config)
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            ) # new
-            read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
-            ) # new
-            await session.initialize()
-            self.sessions.append(session)
-            
-            # List available tools for this session
-            response = await session.list_tools()
-            tools = response.tools
+    async def connect_to_server(self, server_name: str, session) -> List[ToolDefinition]:
+        """List the tools of one initialized MCP server."""
+        response = await session.list_tools()
+        tools = response.tools
+        if isinstance(session, LazySession):
+            print(f"\n{server_name} deferred (lazy), tools from snapshot:", [t.name for t in tools])
+        else:
             print(f"\nConnected to {server_name} with tools:", [t.name for t in tools])
-            
-            for tool in tools: # new
-                self.tool_to_session[tool.name] = session
-                self.available_tools.append({
-                    "name": tool.name,
-                    "description": tool.description,
-                    "input_schema": tool.inputSchema
-                })
-        except Exception as e:
-            print(f"Failed to connect to {server_name}: {e}")
+        return [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                "input_schema": tool.inputSchema
+            }
+            for tool in tools
+        ]
 
     async def connect_to_servers(self): # new
-        """Connect to all configured MCP servers."""
+        """Connect to all configured MCP servers concurrently."""
         try:
             with open("server_config.json", "r") as file:
                 data = json.load(file)
             
             servers = data.get("mcpServers", {})
-            
-            for server_name, server_config in servers.items():
-                await self.connect_to_server(server_name, server_config)
+            # 可选的 "toolCache" 段覆盖或补充各工具的缓存策略
+            self.tool_cache.policies.update(data.get("toolCache", {}))
         except Exception as e:
             print(f"Error loading server configuration: {e}")
             raise
+
+        start = time.perf_counter()
+        connections = await connect_all(servers, self.connect_to_server)
+        for connection in connections.values():
+            self.exit_stack.push_async_callback(connection.close)
+
+        # 按配置顺序登记，工具列表的顺序不受各服务器启动快慢影响
+        for connection in connections.values():
+            if connection.client is None:
+                print(f"Failed to connect to {connection.name}: {connection.error}")
+                continue
+            self.sessions.append(connection.client)
+            for tool in connection.result:
+                self.tool_to_session[tool["name"]] = connection.client
+                self.available_tools.append(tool)
+        print_startup_report(connections, time.perf_counter() - start)
     
     async def process_query(self, query):
         messages = [{'role':'user', 'content':query}]
-        response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'deepseek-chat', 
-                                      tools = self.available_tools,
-                                      messages = messages)
-        process_query = True
-        while process_query:
-            assistant_content = []
-            for content in response.content:
-                if content.type =='text':
-                    print(content.text)
-                    assistant_content.append(content)
-                    if(len(response.content) == 1):
-                        process_query= False
-                elif content.type == 'tool_use':
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    tool_id = content.id
-                    tool_args = content.input
-                    tool_name = content.name
-                    
-    
-                    print(f"Calling tool {tool_name} with args {tool_args}")
-                    
-                    # Call a tool
-                    session = self.tool_to_session[tool_name] # new
-                    result = await session.call_tool(tool_name, arguments=tool_args)
-                    messages.append({"role": "user", 
-                                      "content": [
-                                          {
-                                              "type": "tool_result",
-                                              "tool_use_id":tool_id,
-                                              "content": result.content
-                                          }
-                                      ]
-                                    })
-                    response = self.anthropic.messages.create(max_tokens = 2024,
-                                      model = 'deepseek-chat', 
-                                      tools = self.available_tools,
-                                      messages = messages) 
-                    
-                    if(len(response.content) == 1 and response.content[0].type == "text"):
-                        print(response.content[0].text)
-                        process_query= False
+        await run_turns(self.anthropic, self.tool_to_session.get, self.available_tools, self.tool_cache, messages)
 
-    
-    
     async def chat_loop(self):
         """Run an interactive chat loop"""
         print("\nMCP Chatbot Started!")
         print("Type your queries or 'quit' to exit.")
+        print("Use /cache to show tool cache statistics.")
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()
         
                 if query.lower() == 'quit':
                     break
+
+                if query.lower() == '/cache':
+                    self.tool_cache.print_stats()
+                    continue
                     
                 await self.process_query(query)
                 print("\n")
@@ -137,6 +107,8 @@ class MCP_ChatBot:
     async def cleanup(self): # new
         """Cleanly close all resources using AsyncExitStack."""
         await self.exit_stack.aclose()
+        await self.anthropic.close()
+        connection_stats.report()
 
 
 async def main():
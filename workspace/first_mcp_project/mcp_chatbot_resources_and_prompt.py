@@ -1,14 +1,16 @@
 from dotenv import load_dotenv
-from anthropic import Anthropic
-from mcp import ClientSession, StdioServerParameters, types
-from mcp.client.stdio import stdio_client
+from anthropic import AsyncAnthropic
+from mcp import ClientSession, types
+from server_connections import connect_all, print_startup_report
 from typing import List, Dict, TypedDict
 from contextlib import AsyncExitStack
 import json
+import math
+import time
 import asyncio
-import nest_asyncio
-
-nest_asyncio.apply()
+from llm_http import async_client, connection_stats
+from tool_cache import ToolCache
+from tool_dispatch import run_turns
 
 load_dotenv()
 
@@ -23,113 +25,108 @@ class MCP_ChatBot:
         # 初始化会话和客户端对象
         # self.sessions: List[ClientSession] = [] # new
         self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+        self.anthropic = AsyncAnthropic(http_client=async_client())
         self.available_tools = []
         self.available_prompts = []
         self.sessions = {}
+        # 幂等工具调用和资源读取的结果缓存，/cache 查看命中情况
+        self.tool_cache = ToolCache()
+        # 已订阅更新通知的资源 (id(session), uri)，以及不支持订阅的服务器
+        self.subscriptions = set()
+        self.no_subscribe = set()
         # self.tool_to_session: Dict[str, ClientSession] = {} # new
 
 
-    async def connect_to_server(self, server_name: str, server_config: dict) -> None:
-        """Connect to a single MCP server."""
+    async def connect_to_server(self, server_name: str, session) -> dict:
+        """List the tools, prompts and resources of one initialized server."""
+        capabilities = {"tools": [], "prompts": [], "resources": []}
         try:
-            server_params = StdioServerParameters(**server_config)
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
-            )
-            await session.initialize()
-
             # List available tools
-            try:
-                response = await session.list_tools()
-                for tool in response.tools:
-                    self.sessions[tool.name] = session
-                    self.available_tools.append({
-                        "name": tool.name,
-                        "description": tool.description,
-                        "input_schema": tool.inputSchema
+            response = await session.list_tools()
+            for tool in response.tools:
+                capabilities["tools"].append({
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema
+                })
+        # List available prompts
+            prompts_response = await session.list_prompts()
+            if prompts_response and prompts_response.prompts:
+                for prompt in prompts_response.prompts:
+                    capabilities["prompts"].append({
+                        "name": prompt.name,
+                        "description": prompt.description,
+                        "arguments": prompt.arguments
                     })
-            # List available prompts
-                prompts_response = await session.list_prompts()
-                if prompts_response and prompts_response.prompts:
-                    for prompt in prompts_response.prompts:
-                        self.sessions[prompt.name] = session
-                        self.available_prompts.append({
-                            "name": prompt.name,
-                            "description": prompt.description,
-                            "arguments": prompt.arguments
-                        })
-            
-            # List available resources
-                resources_response = await session.list_resources()
-                if resources_response and resources_response.resources:
-                    for resource in resources_response.resources:
-                        resource_uri = str(resource.uri)
-                        self.sessions[resource.name] = session
-            
-            except Exception as e:
-                print(f"Failed to list tools, prompts, or resources: {e}")
-
+        
+        # List available resources
+            resources_response = await session.list_resources()
+            if resources_response and resources_response.resources:
+                for resource in resources_response.resources:
+                    capabilities["resources"].append(str(resource.uri))
+        
         except Exception as e:
-            print(f"Failed to connect to {server_name}: {e}")
+            print(f"Failed to list tools, prompts, or resources: {e}")
+        return capabilities
 
     async def connect_to_servers(self): # new
-        """Connect to all configured MCP servers."""
+        """Connect to all configured MCP servers concurrently."""
         try:
             with open("server_config.json", "r") as file:
                 data = json.load(file)
             
             servers = data.get("mcpServers", {})
-            
-            for server_name, server_config in servers.items():
-                await self.connect_to_server(server_name, server_config)
+            # 可选的 "toolCache" 段覆盖或补充各工具的缓存策略
+            self.tool_cache.policies.update(data.get("toolCache", {}))
         except Exception as e:
             print(f"Error loading server configuration: {e}")
             raise
+
+        start = time.perf_counter()
+        connections = await connect_all(servers, self.connect_to_server, message_handler=self.handle_message)
+        for connection in connections.values():
+            self.exit_stack.push_async_callback(connection.close)
+
+        # 按配置顺序登记，工具列表的顺序不受各服务器启动快慢影响
+        for connection in connections.values():
+            if connection.client is None:
+                print(f"Failed to connect to {connection.name}: {connection.error}")
+                continue
+            capabilities = connection.result
+            for tool in capabilities["tools"]:
+                self.sessions[tool["name"]] = connection.client
+                self.available_tools.append(tool)
+            for prompt in capabilities["prompts"]:
+                self.sessions[prompt["name"]] = connection.client
+                self.available_prompts.append(prompt)
+            for resource_uri in capabilities["resources"]:
+                self.sessions[resource_uri] = connection.client
+        print_startup_report(connections, time.perf_counter() - start)
     
     async def process_query(self, query):
         messages = [{'role':'user', 'content':query}]
+        await run_turns(self.anthropic, self.sessions.get, self.available_tools, self.tool_cache, messages)
 
-        while True:
-            response = self.anthropic.messages.create(max_tokens = 2024,
-                                        model = 'deepseek-chat', 
-                                        tools = self.available_tools,
-                                        messages = messages)
-            
-            assistant_content = []
-            has_tool_use = False
-            for content in response.content:
-                if content.type =='text':
-                    print(content.text)
-                    assistant_content.append(content)
-                elif content.type == 'tool_use':
-                    has_tool_use = True
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                # Get session and call tool
-                session = self.sessions.get(content.name)
-                if not session:
-                    print(f"Tool {content.name} not found in sessions")
-                    break
-
-                result = await session.call_tool(content.name, arguments=content.input)
-                messages.append({"role": "user",
-                                  "content": [
-                                      {
-                                          "type": "tool_result",
-                                          "tool_use_id":content.id,
-                                          "content": result.content
-                                      }
-                                  ]
-                                })
+    async def handle_message(self, connection, message) -> None:
+        """Drop the local copy of a resource the server reports as updated."""
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ResourceUpdatedNotification):
+            if connection.client is not None:
+                self.tool_cache.discard(connection.client, str(message.root.params.uri))
 
-                # Exit loop if no tool was used
-                if not has_tool_use:
-                    break                      
+    async def subscribe(self, session, resource_uri) -> bool:
+        """Subscribe to updates of a resource once; False if the server does not support it."""
+        if (id(session), resource_uri) in self.subscriptions:
+            return True
+        if id(session) in self.no_subscribe:
+            return False
+        try:
+            await session.subscribe_resource(types.AnyUrl(resource_uri))
+        except Exception as e:
+            print(f"Resource subscriptions unavailable, caching {resource_uri} with a TTL: {e}")
+            self.no_subscribe.add(id(session))
+            return False
+        self.subscriptions.add((id(session), resource_uri))
+        return True
 
     async def get_resource(self, resource_uri):
         """Get a resource from the server."""
@@ -147,7 +144,17 @@ class MCP_ChatBot:
             return
         
         try:
-            result = await session.get_resource(uri=resource_uri)
+            resource_uri = str(types.AnyUrl(resource_uri))
+            result = self.tool_cache.get(session, resource_uri)
+            if result is None:
+                generation = self.tool_cache.generation(session)
+                # 先订阅再读取：读取之后的变化一定会收到通知；
+                # 订阅了的资源一直缓存到服务器通知它变了为止
+                subscribed = await self.subscribe(session, resource_uri)
+                result = await session.read_resource(resource_uri)
+                self.tool_cache.put(
+                    session, resource_uri, None, result, generation, ttl=math.inf if subscribed else None
+                )
             if result and result.contents:
                 print(f"\nResource {resource_uri}")
                 print("Content:")
@@ -207,12 +214,14 @@ class MCP_ChatBot:
         print("Type your queries or 'quit' to exit.")
         print("Use @folders to see available prompts.")
         print("Use @<topic> to search papers in that topic.")
+        print("Use @<topic>?cursor=<n>&limit=<n>&fields=title,authors to page through a large topic.")
         print("Use /prompts to lies available prompts.")
         print("Use /prompt <name> <arg1=value1> to execute a prompt.")
+        print("Use /cache to show tool and resource cache statistics.")
         
         while True:
             try:
-                query = input("\nQuery: ").strip()        
+                query = (await asyncio.to_thread(input, "\nQuery: ")).strip()        
 
                 if not query:
                     continue
@@ -250,6 +259,8 @@ class MCP_ChatBot:
                                 key, value = arg.split('=', 1)
                                 args[key] = value
                         await self.execute_prompt(prompt_name, args)
+                    elif command == '/cache':
+                        self.tool_cache.print_stats()
                     else:
                         print(f"Unknown command: {command}")
                     continue
@@ -263,6 +274,8 @@ class MCP_ChatBot:
     async def cleanup(self): # new
         """Cleanly close all resources using AsyncExitStack."""
         await self.exit_stack.aclose()
+        await self.anthropic.close()
+        connection_stats.report()
 
 
 async def main():
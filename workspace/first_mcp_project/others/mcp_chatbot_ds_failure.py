@@ -1,6 +1,5 @@
 import json
 import asyncio
-import nest_asyncio
 import os
 import openai  # 使用OpenAI兼容的API调用DeepSeek
 from dotenv import load_dotenv
@@ -8,7 +7,9 @@ from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 from typing import List
 
-nest_asyncio.apply()
+# 共用项目目录中的 LLM HTTP 连接池；在 first_mcp_project 下用
+# uv run python -m others.mcp_chatbot_ds_failure 运行（research_server.py 也按这个目录查找）
+from llm_http import async_client, connection_stats
 
 # 加载环境变量
 load_dotenv()
@@ -20,25 +21,26 @@ class MCP_ChatBot:
         self.session: ClientSession = None
         self.client = None
         self.available_tools: List[dict] = []
+        # 初始化DeepSeek客户端：启动时创建一次，所有查询共用同一个连接池
+        api_key = os.getenv('DEEPSEEK_API_KEY')
+        if not api_key:
+            print("错误: 未找到DeepSeek API密钥。请检查.env文件是否已配置DEEPSEEK_API_KEY。")
+        else:
+            self.client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url="https://api.deepseek.com/v1",  # DeepSeek API端点
+                http_client=async_client()
+            )
 
     async def process_query(self, query):
-        # global client
-        # 初始化DeepSeek客户端
         if self.client is None:
-            api_key = os.getenv('DEEPSEEK_API_KEY')
-            if not api_key:
-                print("错误: 未找到DeepSeek API密钥。请检查.env文件是否已配置DEEPSEEK_API_KEY。")
-                return
-
-            self.client = openai.OpenAI(
-                api_key=api_key,
-                base_url="https://api.deepseek.com/v1"  # DeepSeek API端点
-            )
+            print("错误: 未找到DeepSeek API密钥。请检查.env文件是否已配置DEEPSEEK_API_KEY。")
+            return
     
         messages = [{'role':'user', 'content':query}]
 
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="deepseek-chat",  # 使用DeepSeek Chat模型
                 messages=messages,
                 tools = self.available_tools,
@@ -88,7 +90,7 @@ class MCP_ChatBot:
                         })
                         
                         # 获取新的响应
-                        response = self.client.chat.completions.create(
+                        response = await self.client.chat.completions.create(
                             model="deepseek-chat",
                             messages=messages,
                             tools=self.available_tools,
@@ -119,7 +121,7 @@ class MCP_ChatBot:
 
         while True:
             try:
-                query = input("\n查询: ").strip()
+                query = (await asyncio.to_thread(input, "\n查询: ")).strip()
                 if query.lower() == 'quit':
                     print("再见！")
                     break
@@ -162,7 +164,12 @@ class MCP_ChatBot:
 
 async def main():
     chatbot = MCP_ChatBot()
-    await chatbot.connect_to_server_and_run()
+    try:
+        await chatbot.connect_to_server_and_run()
+    finally:
+        if chatbot.client is not None:
+            await chatbot.client.close()
+        connection_stats.report()
   
 
 if __name__ == "__main__":
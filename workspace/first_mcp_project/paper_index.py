@@ -0,0 +1,634 @@
+import contextlib
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from topic_lock import TopicLockManager, atomic_write
+
+PAPERS_FILE = "papers_info.json"
+LOG_FILE = "papers_log.jsonl"
+INDEX_FILE = ".paper_index.jsonl"
+
+# 条目来源：快照 papers_info.json 或追加日志 papers_log.jsonl
+SNAPSHOT, LOG = 0, 1
+
+# 日志超过这个大小且比快照大时，在后台合并回快照
+COMPACT_MIN_BYTES = 64 * 1024
+
+# lookup 未命中时，索引日志和 PAPER_DIR 都没变就不逐个主题 stat；
+# 绕过索引直接改文件的写入者（例如 deepseek_chatbot.py）最多晚这么多秒被发现
+MISS_REFRESH_SECONDS = float(os.getenv("PAPER_INDEX_MISS_REFRESH", "5"))
+
+_WS = re.compile(r"\s*")
+
+# 每条 span 是 (offset, length)：论文条目的值在 papers_info.json 中的字节范围
+Spans = Dict[str, Tuple[int, int]]
+
+
+def dump_papers(papers_info: dict) -> Tuple[bytes, Spans]:
+    """
+    Serialize papers_info exactly like json.dump(indent=2, ensure_ascii=False)
+    and record the byte span of every paper entry.
+
+    Args:
+        papers_info: Mapping of paper_id -> paper info
+
+    Returns:
+        The encoded file content and a mapping of paper_id -> (offset, length)
+    """
+    if not papers_info:
+        return b"{}", {}
+
+    chunks = [b"{\n"]
+    pos = 2
+    spans = {}
+    for i, (paper_id, info) in enumerate(papers_info.items()):
+        prefix = ("  " + json.dumps(paper_id, ensure_ascii=False) + ": ").encode("utf-8")
+        # 嵌套对象需要多缩进一层，字符串里的换行已被转义，直接替换即可
+        value = json.dumps(info, indent=2, ensure_ascii=False).replace("\n", "\n  ").encode("utf-8")
+        sep = b",\n" if i < len(papers_info) - 1 else b"\n"
+        spans[paper_id] = (pos + len(prefix), len(value))
+        chunks += [prefix, value, sep]
+        pos += len(prefix) + len(value) + len(sep)
+    chunks.append(b"}")
+    return b"".join(chunks), spans
+
+
+def scan_spans(data: bytes) -> Spans:
+    """
+    Find the byte span of every top-level entry in a papers_info.json file
+    that was not necessarily written by dump_papers.
+
+    Raises:
+        ValueError: If the content is not a JSON object
+    """
+    text = data.decode("utf-8")
+    decoder = json.JSONDecoder()
+    spans = {}
+
+    # 字符下标 -> 字节偏移，只向前推进，所以整体是线性的
+    last_char, last_byte = 0, 0
+
+    def to_byte(char_idx):
+        nonlocal last_char, last_byte
+        last_byte += len(text[last_char:char_idx].encode("utf-8"))
+        last_char = char_idx
+        return last_byte
+
+    idx = _WS.match(text, 0).end()
+    if text[idx:idx + 1] != "{":
+        raise ValueError("papers file is not a JSON object")
+    idx = _WS.match(text, idx + 1).end()
+    if text[idx:idx + 1] == "}":
+        return spans
+
+    while True:
+        paper_id, idx = decoder.raw_decode(text, idx)
+        idx = _WS.match(text, idx).end()
+        if text[idx:idx + 1] != ":":
+            raise ValueError(f"expected ':' at position {idx}")
+        idx = _WS.match(text, idx + 1).end()
+        _, end = decoder.raw_decode(text, idx)
+        start_byte = to_byte(idx)
+        spans[paper_id] = (start_byte, to_byte(end) - start_byte)
+        idx = _WS.match(text, end).end()
+        if text[idx:idx + 1] == ",":
+            idx = _WS.match(text, idx + 1).end()
+        elif text[idx:idx + 1] == "}":
+            return spans
+        else:
+            raise ValueError(f"expected ',' or '}}' at position {idx}")
+
+
+def log_line(paper_id: str, info: dict) -> bytes:
+    """Encode one papers_log.jsonl record."""
+    return (json.dumps({"id": paper_id, "info": info}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def scan_log(data: bytes, base: int = 0) -> Iterator[Tuple[str, int, int]]:
+    """
+    Yield (paper_id, offset, length) for every complete record in a log chunk.
+
+    A trailing line without a newline (an append that is still in progress or
+    was interrupted) is ignored, as are lines that do not parse.
+    """
+    pos = 0
+    while True:
+        end = data.find(b"\n", pos)
+        if end == -1:
+            return
+        try:
+            paper_id = json.loads(data[pos:end])["id"]
+        except (ValueError, KeyError, TypeError):
+            paper_id = None
+        if paper_id is not None:
+            yield paper_id, base + pos, end + 1 - pos
+        pos = end + 1
+
+
+class PaperIndex:
+    """
+    Log-structured topic files plus a persistent paper_id index over PAPER_DIR.
+
+    Each topic directory holds a snapshot (papers_info.json, the original
+    format) and an append-only papers_log.jsonl. search_papers only appends
+    to the log, so a write costs O(new papers); reads take the last record
+    per ID, and compact_topic() folds the log back into the snapshot.
+
+    The index maps paper_id -> {topic: (source, offset, length)} (a paper can
+    be stored under several topics) and lives in
+    PAPER_DIR/.paper_index.jsonl, itself append-only: a record either resets
+    a topic or adds spans to it. Records carry the stat of the topic files
+    they describe, so topics changed by another process are caught up on load.
+
+    Concurrency: every change to a topic's files happens under that topic's
+    lock (threads and processes), snapshots are replaced atomically, and
+    readers take no topic lock at all. Writers on different topics only share
+    the short in-memory section that updates the index.
+    """
+
+    def __init__(self, paper_dir: str):
+        self.paper_dir = paper_dir
+        self.index_path = os.path.join(paper_dir, INDEX_FILE)
+        self.topics: Dict[str, List[int]] = {}  # topic -> [snapshot mtime_ns, snapshot size, log size]
+        self.papers: Dict[str, Dict[str, Tuple[int, int, int]]] = {}  # paper_id -> {topic: (source, offset, length)}
+        self._topic_papers: Dict[str, Dict[str, None]] = {}  # topic -> paper ids, in stored order
+        self._log_entries = 0  # 索引日志里累计的 span 数，用于决定何时压缩
+        self._compacting = set()
+        self.loaded = False
+        # 上次完整 refresh 之后的 version() 和时间，用来判断未命中时是否值得再刷新
+        self._refreshed_version: Optional[tuple] = None
+        self._refreshed_at = float("-inf")
+        self.locks = TopicLockManager(paper_dir)
+        # 只保护上面的内存结构，持有期间不做主题文件 I/O
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _path(self, topic: str, name: str) -> str:
+        return os.path.join(self.paper_dir, topic, name)
+
+    def _stat(self, topic: str) -> Optional[List[int]]:
+        try:
+            snap = os.stat(self._path(topic, PAPERS_FILE))
+            snap_stat = [snap.st_mtime_ns, snap.st_size]
+        except FileNotFoundError:
+            snap_stat = [0, 0]
+        try:
+            log_size = os.stat(self._path(topic, LOG_FILE)).st_size
+        except FileNotFoundError:
+            log_size = 0
+        if snap_stat == [0, 0] and log_size == 0:
+            return None
+        return snap_stat + [log_size]
+
+    # ---- in-memory index; callers hold self._lock ----
+
+    def _reset_topic(self, topic: str) -> None:
+        for paper_id in self._topic_papers.pop(topic, ()):
+            locations = self.papers.get(paper_id)
+            if locations is not None:
+                locations.pop(topic, None)
+                # 其他主题里还有这篇论文时保留条目
+                if not locations:
+                    del self.papers[paper_id]
+        self.topics.pop(topic, None)
+
+    def _add_spans(self, topic: str, spans) -> None:
+        # 与 read_topic 的顺序一致：快照顺序在前，日志里新出现的 ID 依次追加在后
+        ids = self._topic_papers.setdefault(topic, {})
+        for paper_id, source, offset, length in spans:
+            ids[paper_id] = None
+            locations = self.papers.setdefault(paper_id, {})
+            # 最近写入的主题排在最后，lookup 优先读它
+            locations.pop(topic, None)
+            locations[topic] = (source, offset, length)
+
+    def _topic_spans(self, topic: str):
+        return [(pid,) + self.papers[pid][topic] for pid in self._topic_papers.get(topic, ())]
+
+    def _apply(self, topic: str, stat: Optional[List[int]], reset: bool, spans) -> None:
+        """Apply a topic update in memory and append it to the index log."""
+        if reset:
+            self._reset_topic(topic)
+        if stat is not None:
+            self._add_spans(topic, spans)
+            self.topics[topic] = stat
+        record = {
+            "topic": topic,
+            "stat": stat,
+            "reset": reset,
+            "papers": {paper_id: [source, offset, length] for paper_id, source, offset, length in spans},
+        }
+        os.makedirs(self.paper_dir, exist_ok=True)
+        # 单次 O_APPEND 写入，多个进程同时追加也不会交错
+        fd = os.open(self.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+        self._log_entries += len(spans) + 1
+        # 按累计写入量摊还：压缩的代价 O(总论文数) 分摊到同样数量的写入上
+        if self._log_entries > 2 * len(self.papers) + 1024:
+            self._compact_index()
+
+    def _compact_index(self) -> None:
+        """
+        Rewrite the index log with one reset record per live topic. A record
+        appended concurrently by another process may be lost; that is safe
+        because the stat check re-indexes the topic on the next access.
+        """
+        lines = []
+        for topic in self.topics:
+            record = {
+                "topic": topic,
+                "stat": self.topics[topic],
+                "reset": True,
+                "papers": {pid: [source, off, n] for pid, source, off, n in self._topic_spans(topic)},
+            }
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        atomic_write(self.index_path, "".join(lines).encode("utf-8"))
+        self._log_entries = len(self.topics) + len(self.papers)
+
+    # ---- topic files; callers hold the topic lock ----
+
+    def _scan_topic(self, topic: str, old: Optional[List[int]]):
+        """
+        Read a topic's files and return (stat, reset, spans). Only the new
+        tail of the log is scanned when the snapshot is unchanged.
+        """
+        stat = self._stat(topic)
+        if stat is None:
+            return None, True, []
+        if old is not None and old[:2] == stat[:2] and old[2] <= stat[2]:
+            if old[2] == stat[2]:
+                return stat, False, []
+            with open(self._path(topic, LOG_FILE), "rb") as f:
+                f.seek(old[2])
+                tail = f.read(stat[2] - old[2])
+            return stat, False, [(pid, LOG, off, n) for pid, off, n in scan_log(tail, old[2])]
+
+        spans = []
+        if stat[1]:
+            with open(self._path(topic, PAPERS_FILE), "rb") as f:
+                spans += [(pid, SNAPSHOT, off, n) for pid, (off, n) in scan_spans(f.read()).items()]
+        if stat[2]:
+            with open(self._path(topic, LOG_FILE), "rb") as f:
+                spans += [(pid, LOG, off, n) for pid, off, n in scan_log(f.read(stat[2]))]
+        return stat, True, spans
+
+    def _repair_log_tail(self, log_path: str) -> None:
+        # 上次追加被中断留下的半行会和下一条记录粘在一起，先截掉
+        try:
+            with open(log_path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) == b"\n":
+                    return
+                f.seek(0)
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
+
+    def _index_topic(self, topic: str) -> bool:
+        """Bring one topic up to date with its files. Returns False if they cannot be parsed."""
+        with self.locks.lock(topic):
+            with self._lock:
+                old = self.topics.get(topic)
+            try:
+                stat, reset, spans = self._scan_topic(topic, old)
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                print(f"Error indexing {self._path(topic, PAPERS_FILE)}: {str(e)}", file=sys.stderr)
+                return False
+            with self._lock:
+                self._apply(topic, stat, reset, spans)
+            return True
+
+    # ---- public API ----
+
+    def load(self) -> None:
+        """Load the index from disk and catch up any topic whose files changed."""
+        with self._load_lock:
+            self._load()
+
+    def _load(self) -> None:
+        with self._lock:
+            self.topics, self.papers, self._topic_papers = {}, {}, {}
+            self._log_entries = 0
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # 写到一半被中断的最后一行，直接忽略
+                            continue
+                        self._log_entries += len(record["papers"]) + 1
+                        topic = record["topic"]
+                        if record.get("reset", True):
+                            self._reset_topic(topic)
+                        if record["stat"] is None:
+                            continue
+                        self._add_spans(topic, [
+                            (pid, *(span if len(span) == 3 else [SNAPSHOT] + span))
+                            for pid, span in record["papers"].items()
+                        ])
+                        self.topics[topic] = record["stat"]
+            except FileNotFoundError:
+                pass
+            self.loaded = True
+        self.refresh()
+
+    def _ensure_loaded(self) -> None:
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self._load()
+
+    def list_topics(self) -> List[str]:
+        """Names of the topic directories that hold a snapshot or a log."""
+        topics = []
+        if os.path.isdir(self.paper_dir):
+            for item in os.listdir(self.paper_dir):
+                if os.path.isfile(self._path(item, PAPERS_FILE)) or os.path.isfile(self._path(item, LOG_FILE)):
+                    topics.append(item)
+        return topics
+
+    def refresh(self) -> bool:
+        """
+        Bring the index in line with PAPER_DIR using one stat per topic.
+
+        Returns:
+            True if any topic was re-indexed or dropped
+        """
+        on_disk = set(self.list_topics())
+        with self._lock:
+            known = dict(self.topics)
+        changed = False
+        for topic in on_disk | set(known):
+            if known.get(topic) != self._stat(topic):
+                changed = self._index_topic(topic) or changed
+        # 在重建索引之后记录，避免自己刚追加的索引记录让下一次未命中又刷新一遍
+        self._refreshed_version = self.version()
+        self._refreshed_at = time.monotonic()
+        return changed
+
+    def _refresh_due(self) -> bool:
+        """
+        Cheap check before a miss-triggered refresh: one stat of PAPER_DIR and
+        one of the index log, plus a periodic full refresh for writers that
+        bypass the index.
+        """
+        return self.version() != self._refreshed_version \
+            or time.monotonic() - self._refreshed_at >= MISS_REFRESH_SECONDS
+
+    def version(self, topic: Optional[str] = None) -> Optional[tuple]:
+        """
+        Stat-based token for a topic's files, or for the topic list when topic is None.
+
+        Every write appends to the index log, so its stat plus PAPER_DIR's
+        covers topics created by other processes too.
+        """
+        if topic is not None:
+            stat = self._stat(topic)
+            return tuple(stat) if stat is not None else None
+        try:
+            index = os.stat(self.index_path)
+            return os.stat(self.paper_dir).st_mtime_ns, index.st_mtime_ns, index.st_size
+        except FileNotFoundError:
+            return None
+
+    def topic_summary(self, topic: str) -> Optional[Tuple[int, float]]:
+        """(paper count, last modification time) of a topic, or None if it does not exist."""
+        self._ensure_loaded()
+        stat = self._stat(topic)
+        with self._lock:
+            current = self.topics.get(topic) == stat
+        if not current:
+            self._index_topic(topic)
+        updated = 0.0
+        for name in (PAPERS_FILE, LOG_FILE):
+            try:
+                updated = max(updated, os.stat(self._path(topic, name)).st_mtime)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if topic not in self.topics:
+                return None
+            return len(self._topic_papers.get(topic, ())), updated
+
+    def count(self) -> int:
+        """Number of distinct paper IDs across all topics, after a refresh."""
+        self._ensure_loaded()
+        self.refresh()
+        with self._lock:
+            return len(self.papers)
+
+    def append_papers(self, topic: str, papers: Dict[str, dict]) -> str:
+        """
+        Append papers to a topic's log and index them. Cost is O(len(papers)),
+        independent of how many papers the topic already holds.
+
+        Args:
+            topic: Topic directory name under PAPER_DIR
+            papers: Mapping of paper_id -> paper info to add or replace
+
+        Returns:
+            Path of the topic's log file
+        """
+        self._ensure_loaded()
+        log_path = self._path(topic, LOG_FILE)
+        with self.locks.lock(topic):
+            with self._lock:
+                known = self.topics.get(topic)
+            if known != self._stat(topic):
+                # 其他进程写过这个主题，先追上再追加
+                self._index_topic(topic)
+            os.makedirs(os.path.join(self.paper_dir, topic), exist_ok=True)
+            self._repair_log_tail(log_path)
+
+            lines = [log_line(paper_id, info) for paper_id, info in papers.items()]
+            with open(log_path, "ab") as f:
+                offset = f.tell()
+                f.write(b"".join(lines))
+            spans = []
+            for paper_id, line in zip(papers, lines):
+                spans.append((paper_id, LOG, offset, len(line)))
+                offset += len(line)
+            stat = self._stat(topic)
+
+            with self._lock:
+                self._apply(topic, stat, False, spans)
+                compact = stat[2] > max(COMPACT_MIN_BYTES, stat[1]) and topic not in self._compacting
+                if compact:
+                    self._compacting.add(topic)
+
+        if compact:
+            # 合并的代价是 O(主题大小)，放到后台线程，不占用写入路径
+            threading.Thread(target=self.compact_topic, args=(topic,), daemon=True).start()
+        return log_path
+
+    def read_topic(self, topic: str) -> Optional[Dict[str, dict]]:
+        """
+        Read a topic as paper_id -> info: the snapshot with the log applied.
+
+        Returns:
+            None if the topic has neither a snapshot nor a log
+
+        Raises:
+            json.JSONDecodeError: If the snapshot is corrupted
+        """
+        # 不加锁：先读日志再读快照。若两次读取之间发生合并，新快照已包含这段日志，
+        # 再套用一遍旧日志得到的值不变
+        try:
+            with open(self._path(topic, LOG_FILE), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = None
+        try:
+            with open(self._path(topic, PAPERS_FILE), "r", encoding="utf-8") as f:
+                papers_info = json.load(f)
+        except FileNotFoundError:
+            papers_info = None
+        if data is None:
+            return papers_info
+        if papers_info is None:
+            papers_info = {}
+        for _, offset, length in scan_log(data):
+            record = json.loads(data[offset:offset + length])
+            papers_info[record["id"]] = record["info"]
+        return papers_info
+
+    def read_page(self, topic: str, offset: int, limit: int) -> Optional[Tuple[int, Dict[str, dict]]]:
+        """
+        Read one page of a topic through the index, touching only the spans
+        of the papers on that page.
+
+        Args:
+            topic: Topic directory name under PAPER_DIR
+            offset: Index of the first paper, in read_topic order
+            limit: Maximum number of papers to return
+
+        Returns:
+            (total papers in topic, paper_id -> info for the page), or None
+            if the topic does not exist
+        """
+        self._ensure_loaded()
+        for _ in range(3):
+            stat = self._stat(topic)
+            with self._lock:
+                current = self.topics.get(topic) == stat
+            if not current and not self._index_topic(topic):
+                break
+            with self._lock:
+                recorded = self.topics.get(topic)
+                if recorded is None:
+                    return None
+                ids = self._topic_papers.get(topic, {})
+                total = len(ids)
+                spans = [(pid,) + self.papers[pid][topic] for pid in itertools.islice(ids, offset, offset + limit)]
+
+            page = {}
+            try:
+                with open(self._path(topic, PAPERS_FILE), "rb") if recorded[1] else contextlib.nullcontext() as snap, \
+                        open(self._path(topic, LOG_FILE), "rb") if recorded[2] else contextlib.nullcontext() as log:
+                    for paper_id, source, span_offset, length in spans:
+                        f = snap if source == SNAPSHOT else log
+                        f.seek(span_offset)
+                        value = json.loads(f.read(length))
+                        if source == LOG:
+                            value = value["info"] if value.get("id") == paper_id else None
+                        if value is None:
+                            break
+                        page[paper_id] = value
+            except (OSError, ValueError, AttributeError):
+                page = None
+            # 与 lookup 相同：快照没换、日志没缩短时读到的 span 仍然有效
+            current = self._stat(topic)
+            if page is not None and len(page) == len(spans) and current is not None \
+                    and current[:2] == recorded[:2] and current[2] >= recorded[2]:
+                return total, page
+            self._index_topic(topic)
+
+        # 索引一直追不上（例如文件被并发替换），退回整读
+        papers = self.read_topic(topic)
+        if papers is None:
+            return None
+        return len(papers), dict(itertools.islice(papers.items(), offset, offset + limit))
+
+    def compact_topic(self, topic: str) -> None:
+        """Fold a topic's log into its snapshot and truncate the log."""
+        try:
+            with self.locks.lock(topic):
+                papers_info = self.read_topic(topic)
+                if papers_info is None:
+                    return
+                data, spans = dump_papers(papers_info)
+                atomic_write(self._path(topic, PAPERS_FILE), data)
+                # 在这之前崩溃也没关系：日志重放是幂等的
+                try:
+                    os.remove(self._path(topic, LOG_FILE))
+                except FileNotFoundError:
+                    pass
+                stat = self._stat(topic)
+                with self._lock:
+                    self._apply(topic, stat, True, [(pid, SNAPSHOT, off, n) for pid, (off, n) in spans.items()])
+        except (OSError, ValueError) as e:
+            print(f"Error compacting {topic}: {str(e)}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._compacting.discard(topic)
+
+    def lookup(self, paper_id: str) -> Optional[dict]:
+        """
+        Look up a paper by ID without scanning the other topics.
+
+        Args:
+            paper_id: The ID of the paper to look for
+
+        Returns:
+            The stored paper info, or None if the paper is unknown
+        """
+        self._ensure_loaded()
+        refreshed = False
+        for _ in range(3):
+            with self._lock:
+                locations = self.papers.get(paper_id)
+                if locations:
+                    topic = next(reversed(locations))
+                    entry = (topic,) + locations[topic]
+                else:
+                    entry = None
+                recorded = self.topics.get(entry[0]) if entry else None
+            if entry is None:
+                if not refreshed and self._refresh_due() and self.refresh():
+                    # 未命中时可能是别的进程新建了主题，按 stat 增量刷新后再试一次
+                    refreshed = True
+                    continue
+                return None
+
+            topic, source, offset, length = entry
+            name = PAPERS_FILE if source == SNAPSHOT else LOG_FILE
+            try:
+                with open(self._path(topic, name), "rb") as f:
+                    f.seek(offset)
+                    value = json.loads(f.read(length))
+                if source == LOG:
+                    value = value["info"] if value.get("id") == paper_id else None
+            except (OSError, ValueError, AttributeError):
+                value = None
+            # 读完再核对一次 stat：只要快照没换、日志没缩短，已有 span 就仍然有效
+            # （其他写入者只会往日志末尾追加）
+            current = self._stat(topic)
+            if value is not None and current is not None and recorded is not None \
+                    and current[:2] == recorded[:2] and current[2] >= recorded[2]:
+                return value
+            self._index_topic(topic)
+        return None
@@ -0,0 +1,340 @@
+import abc
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from paper_index import PaperIndex
+
+SQLITE_FILE = "papers.db"
+
+
+class PaperStore(abc.ABC):
+    """
+    Storage interface used by the research server.
+
+    Topics are the directory-style names used under PAPER_DIR
+    (lower case, spaces replaced by underscores). Paper info is the dict
+    written by search_papers: title, authors, summary, pdf_url, published.
+    """
+
+    def load(self) -> None:
+        """Prepare the store before serving requests (e.g. rebuild stale indexes)."""
+        pass
+
+    @abc.abstractmethod
+    def add_papers(self, topic: str, papers: Dict[str, dict]) -> str:
+        """Merge papers into a topic. Returns a human readable location."""
+
+    @abc.abstractmethod
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        """Return one paper's info, or None if it is not stored."""
+
+    @abc.abstractmethod
+    def list_topics(self) -> List[str]:
+        """Return the names of all topics that have stored papers."""
+
+    @abc.abstractmethod
+    def get_topic_papers(self, topic: str) -> Optional[Dict[str, dict]]:
+        """Return paper_id -> info for a topic, or None if the topic does not exist."""
+
+    def get_topic_page(self, topic: str, offset: int, limit: int) -> Optional[Tuple[int, Dict[str, dict]]]:
+        """
+        Return (total papers in topic, paper_id -> info for one page in stored order),
+        or None if the topic does not exist.
+        """
+        papers = self.get_topic_papers(topic)
+        if papers is None:
+            return None
+        return len(papers), dict(itertools.islice(papers.items(), offset, offset + limit))
+
+    @abc.abstractmethod
+    def paper_count(self) -> int:
+        """Return the number of distinct stored paper IDs."""
+
+    @abc.abstractmethod
+    def topic_summary(self, topic: str) -> Optional[Tuple[int, float]]:
+        """Return (paper count, last update time) for a topic, or None if it does not exist."""
+
+    def version(self, topic: Optional[str] = None) -> Optional[tuple]:
+        """
+        Return a cheap token that changes whenever the topic (or, without a
+        topic, the list of topics) changes, or None if it cannot be cached.
+        """
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class JSONPaperStore(PaperStore):
+    """
+    The original layout: PAPER_DIR/<topic>/papers_info.json, plus an
+    append-only papers_log.jsonl per topic that is compacted into it.
+    """
+
+    def __init__(self, paper_dir: str):
+        self.paper_dir = paper_dir
+        self.index = PaperIndex(paper_dir)
+
+    def load(self) -> None:
+        self.index.load()
+
+    def add_papers(self, topic: str, papers: Dict[str, dict]) -> str:
+        return self.index.append_papers(topic, papers)
+
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        return self.index.lookup(paper_id)
+
+    def list_topics(self) -> List[str]:
+        return self.index.list_topics()
+
+    def get_topic_papers(self, topic: str) -> Optional[Dict[str, dict]]:
+        return self.index.read_topic(topic)
+
+    def get_topic_page(self, topic: str, offset: int, limit: int) -> Optional[Tuple[int, Dict[str, dict]]]:
+        # 按索引里记录的 span 只读这一页，内存占用与主题大小无关
+        return self.index.read_page(topic, offset, limit)
+
+    def paper_count(self) -> int:
+        return self.index.count()
+
+    def topic_summary(self, topic: str) -> Optional[Tuple[int, float]]:
+        return self.index.topic_summary(topic)
+
+    def version(self, topic: Optional[str] = None) -> Optional[tuple]:
+        return self.index.version(topic)
+
+    def compact(self) -> None:
+        """Fold every topic's log into its snapshot."""
+        for topic in self.list_topics():
+            self.index.compact_topic(topic)
+
+
+class SQLitePaperStore(PaperStore):
+    """
+    SQLite backend (WAL mode) with papers, authors and topic membership tables.
+
+    Every lookup goes through a primary key or index, so the cost of a call
+    does not grow with the number of stored topics or papers.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS papers (
+            id        TEXT PRIMARY KEY,
+            title     TEXT NOT NULL,
+            summary   TEXT NOT NULL,
+            pdf_url   TEXT,
+            published TEXT
+        );
+        CREATE TABLE IF NOT EXISTS authors (
+            paper_id  TEXT NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+            position  INTEGER NOT NULL,
+            name      TEXT NOT NULL,
+            PRIMARY KEY (paper_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_authors_name ON authors(name);
+        CREATE TABLE IF NOT EXISTS topics (
+            name      TEXT PRIMARY KEY,
+            updated   REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS topic_papers (
+            seq       INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic     TEXT NOT NULL REFERENCES topics(name),
+            paper_id  TEXT NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+            UNIQUE (topic, paper_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_topic_papers_paper ON topic_papers(paper_id);
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        # extract_info 在工作线程中执行，连接由锁保护
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(self.SCHEMA)
+
+    def _upsert(self, topic: str, papers: Dict[str, dict]) -> None:
+        cur = self._conn.cursor()
+        cur.execute(
+            "INSERT INTO topics (name, updated) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET updated=excluded.updated",
+            (topic, time.time()),
+        )
+        for paper_id, info in papers.items():
+            cur.execute(
+                "INSERT INTO papers (id, title, summary, pdf_url, published) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET title=excluded.title, summary=excluded.summary, "
+                "pdf_url=excluded.pdf_url, published=excluded.published",
+                (paper_id, info["title"], info["summary"], info.get("pdf_url"), info.get("published")),
+            )
+            cur.execute("DELETE FROM authors WHERE paper_id = ?", (paper_id,))
+            cur.executemany(
+                "INSERT INTO authors (paper_id, position, name) VALUES (?, ?, ?)",
+                [(paper_id, i, name) for i, name in enumerate(info.get("authors", []))],
+            )
+            cur.execute("INSERT OR IGNORE INTO topic_papers (topic, paper_id) VALUES (?, ?)", (topic, paper_id))
+
+    def add_papers(self, topic: str, papers: Dict[str, dict]) -> str:
+        with self._lock, self._conn:
+            self._upsert(topic, papers)
+        return f"{self.db_path} (topic: {topic})"
+
+    def _authors(self, paper_ids: List[str]) -> Dict[str, List[str]]:
+        authors = {paper_id: [] for paper_id in paper_ids}
+        # SQLite 默认最多 999 个绑定参数，分批查询
+        for i in range(0, len(paper_ids), 500):
+            batch = paper_ids[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT paper_id, name FROM authors WHERE paper_id IN ({','.join('?' * len(batch))}) "
+                "ORDER BY paper_id, position",
+                batch,
+            )
+            for paper_id, name in rows:
+                authors[paper_id].append(name)
+        return authors
+
+    @staticmethod
+    def _info(row, authors: List[str]) -> dict:
+        _, title, summary, pdf_url, published = row
+        return {
+            "title": title,
+            "authors": authors,
+            "summary": summary,
+            "pdf_url": pdf_url,
+            "published": published,
+        }
+
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, title, summary, pdf_url, published FROM papers WHERE id = ?", (paper_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._info(row, self._authors([paper_id])[paper_id])
+
+    def list_topics(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM topics ORDER BY rowid")
+            return [topic for (topic,) in rows]
+
+    def get_topic_papers(self, topic: str) -> Optional[Dict[str, dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.id, p.title, p.summary, p.pdf_url, p.published FROM topic_papers t "
+                "JOIN papers p ON p.id = t.paper_id WHERE t.topic = ? ORDER BY t.seq",
+                (topic,),
+            ).fetchall()
+            if not rows:
+                return None
+            authors = self._authors([row[0] for row in rows])
+            return {row[0]: self._info(row, authors[row[0]]) for row in rows}
+
+    def get_topic_page(self, topic: str, offset: int, limit: int) -> Optional[Tuple[int, Dict[str, dict]]]:
+        # 只取这一页的行，内存占用与主题大小无关
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM topic_papers WHERE topic = ?", (topic,)).fetchone()[0]
+            if not total:
+                return None
+            rows = self._conn.execute(
+                "SELECT p.id, p.title, p.summary, p.pdf_url, p.published FROM topic_papers t "
+                "JOIN papers p ON p.id = t.paper_id WHERE t.topic = ? ORDER BY t.seq LIMIT ? OFFSET ?",
+                (topic, limit, offset),
+            ).fetchall()
+            authors = self._authors([row[0] for row in rows])
+            return total, {row[0]: self._info(row, authors[row[0]]) for row in rows}
+
+    def paper_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def topic_summary(self, topic: str) -> Optional[Tuple[int, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM topic_papers WHERE topic = t.name), t.updated FROM topics t WHERE t.name = ?",
+                (topic,),
+            ).fetchone()
+            return tuple(row) if row is not None else None
+
+    def version(self, topic: Optional[str] = None) -> Optional[tuple]:
+        # 一篇论文可能属于多个主题，任何写入都让所有主题的版本变化
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*), MAX(updated) FROM topics").fetchone()
+
+    def migrate_from_json(self, paper_dir: str) -> int:
+        """
+        One-shot import of an existing PAPER_DIR/<topic>/papers_info.json tree.
+
+        Returns:
+            Number of papers imported (0 if the migration already ran)
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+            if done:
+                return 0
+            source = JSONPaperStore(paper_dir)
+            count = 0
+            with self._conn:
+                for topic in source.list_topics():
+                    try:
+                        papers = source.get_topic_papers(topic) or {}
+                    except json.JSONDecodeError as e:
+                        print(f"跳过无法解析的主题 {topic}: {e}", file=sys.stderr)
+                        continue
+                    self._upsert(topic, papers)
+                    count += len(papers)
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)", (os.path.abspath(paper_dir),)
+                )
+            return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(paper_dir: str, backend: Optional[str] = None) -> PaperStore:
+    """
+    Create the papers store selected by backend or the PAPER_STORE env var.
+
+    Args:
+        paper_dir: The papers directory (PAPER_DIR)
+        backend: "json" (default) or "sqlite"
+    """
+    backend = (backend or os.getenv("PAPER_STORE", "json")).lower()
+    if backend == "json":
+        return JSONPaperStore(paper_dir)
+    if backend == "sqlite":
+        store = SQLitePaperStore(os.path.join(paper_dir, SQLITE_FILE))
+        # 第一次打开时导入已有的 JSON 目录，之后不再重复
+        store.migrate_from_json(paper_dir)
+        return store
+    raise ValueError(f"Unknown paper store backend: {backend}")
+
+
+if __name__ == "__main__":
+    # 用法: python paper_store.py migrate|compact [papers_dir]
+    command = sys.argv[1] if len(sys.argv) >= 2 else None
+    paper_dir = sys.argv[2] if len(sys.argv) > 2 else "papers"
+    if command == "migrate":
+        store = SQLitePaperStore(os.path.join(paper_dir, SQLITE_FILE))
+        print(f"已迁移 {store.migrate_from_json(paper_dir)} 篇论文到 {store.db_path}")
+        store.close()
+    elif command == "compact":
+        JSONPaperStore(paper_dir).compact()
+        print(f"已将 {paper_dir} 下的追加日志合并到 papers_info.json")
+    else:
+        print("Usage: python paper_store.py migrate|compact [papers_dir]")
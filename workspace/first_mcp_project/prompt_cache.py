@@ -0,0 +1,71 @@
+from typing import Any, List, Tuple
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _mark_last_block(message: dict) -> dict:
+    content = message["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = list(content)
+    last = blocks[-1]
+    if not isinstance(last, dict):
+        # SDK 返回的内容块（助手消息）转成 dict 才能加标记
+        last = last.model_dump(exclude_none=True)
+    blocks[-1] = dict(last, cache_control=CACHE_CONTROL)
+    return dict(message, content=blocks)
+
+
+def with_cache_breakpoints(tools: List[dict], messages: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Add Anthropic prompt-cache breakpoints to one request.
+
+    The request prefix is tools -> messages, so one breakpoint goes on the
+    last tool definition (the merged tool list never changes within a
+    session) and one on the last message, which lets the next iteration of a
+    tool loop read everything before its new turn from the cache. Inputs are
+    not modified.
+
+    The cached prefix only matches if the earlier messages are sent exactly
+    as before. With ContextBudget.prepare() that holds between the requests
+    that elide a new batch of old tool results; such a request is a cache
+    write from the first newly elided result on.
+
+    Returns:
+        (tools, messages) to pass to messages.create
+    """
+    if tools:
+        tools = tools[:-1] + [dict(tools[-1], cache_control=CACHE_CONTROL)]
+    if messages and messages[-1].get("content"):
+        messages = messages[:-1] + [_mark_last_block(messages[-1])]
+    return tools, messages
+
+
+class CacheUsage:
+    """Sums the usage fields of every request in one query."""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+
+    def add(self, usage: Any) -> None:
+        if usage is None:
+            return
+        self.requests += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.output_tokens += usage.output_tokens or 0
+        self.cache_creation_input_tokens += getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.cache_read_input_tokens += getattr(usage, "cache_read_input_tokens", None) or 0
+
+    def report(self) -> None:
+        total = self.input_tokens + self.cache_creation_input_tokens + self.cache_read_input_tokens
+        hit_rate = self.cache_read_input_tokens / total if total else 0.0
+        print(
+            f"[cache] {self.requests} requests: input {self.input_tokens}, "
+            f"cache write {self.cache_creation_input_tokens}, cache read {self.cache_read_input_tokens} "
+            f"({hit_rate:.0%} of prompt tokens from cache), output {self.output_tokens}"
+        )
@@ -1,17 +1,95 @@
 import arxiv
+import asyncio
 import json
 import os
-from typing import List
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
 from mcp.server.fastmcp import FastMCP
+from arxiv_client import AsyncArxivClient
+from local_search import BM25Index
+from paper_store import open_store
+from search_cache import SearchCache
+from tfidf_index import TfidfIndex
+from topic_catalog import TopicCatalog
 
 PAPER_DIR = "papers"
 
+# 论文存储后端：PAPER_STORE=json（默认，每个主题一个 papers_info.json）或 sqlite
+store = open_store(PAPER_DIR)
+
+# 整个服务器生命周期共用一个 arXiv 客户端（连接池 + keep-alive）
+arxiv_client = AsyncArxivClient()
+
+# 相同查询在 TTL 内直接返回已保存的论文 ID，不再访问 arXiv
+search_cache = SearchCache(
+    PAPER_DIR,
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+)
+
+# 已保存论文的本地全文索引，首次 search_local 时构建，之后随写入增量更新
+local_index = BM25Index()
+
+# related_papers 用的摘要 TF-IDF 矩阵，持久化在 papers/.tfidf/
+tfidf_index = TfidfIndex(PAPER_DIR)
+
+# 主题目录（论文数、最后更新时间），由后台 inotify 监视保持最新
+catalog = TopicCatalog(store, PAPER_DIR)
+
 # Initialize FastMCP server
 mcp = FastMCP("research")
 
+def save_papers(topic: str, papers: List[arxiv.Result]) -> List[str]:
+    """
+    Merge arXiv results into the topic's store with a single write.
+    
+    Returns:
+        List of the stored paper IDs, in result order
+    """
+    topic_dir = topic.lower().replace(" ", "_")
+
+    # Process each paper and collect its info
+    paper_ids = []
+    papers_info = {}
+    for paper in papers:
+        paper_id = paper.entry_id.split('/')[-1]
+        paper_ids.append(paper_id)
+        paper_info = {
+            'title': paper.title,
+            'authors': [author.name for author in paper.authors],
+            'summary': paper.summary,
+            'pdf_url': paper.pdf_url,
+            'published': str(paper.published.date()) if paper.published else 'Unknown'
+        }
+        papers_info[paper_id] = paper_info
+    
+    location = store.add_papers(topic_dir, papers_info)
+    local_index.add_papers(papers_info)
+    tfidf_index.mark_dirty(store)
+    catalog.update(topic_dir)
+    print(f"结果保存在: {location}", file=sys.stderr)
+    return paper_ids
+
+def save_search(topic: str, max_results: int, papers: List[arxiv.Result]) -> List[str]:
+    """
+    Store a search's papers and remember its result IDs in the search cache.
+
+    Both writes block (the topic append takes the topic's file lock, the
+    search cache is an fsync'ing atomic write), so callers run this in a
+    worker thread.
+
+    Returns:
+        List of the stored paper IDs, in result order
+    """
+    paper_ids = save_papers(topic, papers)
+    search_cache.put(topic, max_results, paper_ids)
+    return paper_ids
+
 # 工具函数保持不变
 @mcp.tool()
-def search_papers(topic: str, max_results: int = 5) -> List[str]:
+async def search_papers(topic: str, max_results: int = 5) -> List[str]:
     """
     Search for papers on arXiv based on a topic and store their information.
     
@@ -23,10 +101,11 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         List of paper IDs found in the search
     """
     
-    try:
-        # Use arxiv to find the papers 
-        client = arxiv.Client()
+    cached_ids = search_cache.get(topic, max_results)
+    if cached_ids is not None:
+        return cached_ids
 
+    try:
         # Search for the most relevant articles matching the queried topic
         search = arxiv.Search(
             query=topic,
@@ -34,51 +113,72 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
             sort_by=arxiv.SortCriterion.Relevance
         )
 
-        papers = list(client.results(search))
+        # Use the shared client; the event loop keeps serving other requests meanwhile
+        papers = await arxiv_client.search(search)
         
-        # Create directory for this topic
-        path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-        os.makedirs(path, exist_ok=True)
+        # Merge the new papers into the topic store and cache the result IDs off the event loop
+        paper_ids = await asyncio.to_thread(save_search, topic, max_results, papers)
         
-        file_path = os.path.join(path, "papers_info.json")
-
-        # Try to load existing papers info
-        try:
-            with open(file_path, "r", encoding='utf-8') as json_file:
-                papers_info = json.load(json_file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            papers_info = {}
-
-        # Process each paper and add to papers_info  
-        paper_ids = []
-        for paper in papers:
-            paper_id = paper.entry_id.split('/')[-1]
-            paper_ids.append(paper_id)
-            paper_info = {
-                'title': paper.title,
-                'authors': [author.name for author in paper.authors],
-                'summary': paper.summary,
-                'pdf_url': paper.pdf_url,
-                'published': str(paper.published.date()) if paper.published else 'Unknown'
-            }
-            papers_info[paper_id] = paper_info
-        
-        # Save updated papers_info to json file
-        with open(file_path, "w", encoding='utf-8') as json_file:
-            json.dump(papers_info, json_file, indent=2, ensure_ascii=False)
-        
-        print(f"成功搜索到 {len(papers)} 篇论文")
-        print(f"结果保存在: {file_path}")
+        print(f"成功搜索到 {len(papers)} 篇论文", file=sys.stderr)
         
         return paper_ids
         
     except Exception as e:
-        print(f"搜索论文时出错: {e}")
-        print("请检查网络连接或稍后重试")
+        print(f"搜索论文时出错: {e}", file=sys.stderr)
+        print("请检查网络连接或稍后重试", file=sys.stderr)
         return []
 
 @mcp.tool()
-def extract_info(paper_id: str) -> str:
+async def search_papers_batch(topics: List[str], max_results: int = 5) -> Dict[str, List[str]]:
+    """
+    Search for papers on arXiv for several topics at once and store their information.
+    
+    Args:
+        topics: The topics to search for
+        max_results: Maximum number of results to retrieve per topic (default: 5)
+        
+    Returns:
+        Mapping of each topic to the list of paper IDs found for it
+    """
+    
+    # 只差大小写或空格的主题落在同一个目录里，按目录名去重，每个只搜索一次
+    unique = {}
+    for topic in topics:
+        unique.setdefault(topic.lower().replace(" ", "_"), topic)
+
+    results = {}
+    pending = []
+    for topic_dir, topic in unique.items():
+        cached_ids = search_cache.get(topic, max_results)
+        if cached_ids is not None:
+            results[topic_dir] = cached_ids
+        else:
+            pending.append((topic_dir, topic))
+
+    # 按 arXiv 的礼貌间隔流水线式发出请求，不必等上一个响应返回
+    searches = [
+        arxiv.Search(query=topic, max_results=max_results, sort_by=arxiv.SortCriterion.Relevance)
+        for _, topic in pending
+    ]
+    fetched = await arxiv_client.search_many(searches)
+
+    for (topic_dir, topic), papers in zip(pending, fetched):
+        if isinstance(papers, Exception):
+            print(f"搜索 {topic} 的论文时出错: {papers}", file=sys.stderr)
+            results[topic_dir] = []
+            continue
+        # One write per topic; a failed write only loses this topic's results
+        try:
+            results[topic_dir] = await asyncio.to_thread(save_search, topic, max_results, papers)
+        except Exception as e:
+            print(f"保存 {topic} 的论文时出错: {e}", file=sys.stderr)
+            results[topic_dir] = []
+
+    print(f"成功搜索了 {len(unique)} 个主题，其中 {len(pending)} 个访问了 arXiv", file=sys.stderr)
+    return {topic: results[topic.lower().replace(" ", "_")] for topic in topics}
+
+@mcp.tool()
+async def extract_info(paper_id: str) -> str:
     """
     Search for information about a specific paper across all topic directories.
     
@@ -88,24 +188,76 @@ def extract_info(paper_id: str) -> str:
     Returns:
         JSON string with paper information if found, error message if not found
     """
- 
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r", encoding='utf-8') as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2, ensure_ascii=False)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+
+    paper_info = await asyncio.to_thread(store.get_paper, paper_id)
+    if paper_info is not None:
+        return json.dumps(paper_info, indent=2, ensure_ascii=False)
     
     return f"没有找到与论文 {paper_id} 相关的保存信息。"
 
+@mcp.tool()
+async def search_local(query: str, k: int = 10) -> List[str]:
+    """
+    Search the papers already stored locally, ranked by BM25 over title, summary and authors.
+    
+    Args:
+        query: Free-text query
+        k: Maximum number of paper IDs to return (default: 10)
+        
+    Returns:
+        List of matching paper IDs, best match first
+    """
+
+    if not local_index.built:
+        # 只有第一次需要读取全部主题
+        await asyncio.to_thread(local_index.build, store)
+    return [paper_id for paper_id, _ in local_index.search(query, k)]
+
+@mcp.tool()
+async def related_papers(paper_id: str, k: int = 5) -> List[str]:
+    """
+    Find the stored papers most similar to a given paper, by cosine similarity of their summaries.
+    
+    Args:
+        paper_id: The ID of a stored paper
+        k: Maximum number of related paper IDs to return (default: 5)
+        
+    Returns:
+        List of related paper IDs, most similar first (empty if the paper is not stored)
+    """
+
+    related = await asyncio.to_thread(tfidf_index.related, store, paper_id, k)
+    if related is None:
+        print(f"没有找到与论文 {paper_id} 相关的保存信息。", file=sys.stderr)
+        return []
+    return [related_id for related_id, _ in related]
+
+@mcp.tool()
+async def recent_topics(hours: float = 24) -> List[dict]:
+    """
+    List the stored topics that received papers within the last few hours.
+    
+    Args:
+        hours: How far back to look, in hours (default: 24)
+        
+    Returns:
+        List of {"topic", "papers", "updated"} entries, most recently updated first
+    """
+
+    topics = catalog.updated_since(time.time() - hours * 3600)
+    return [
+        {
+            "topic": topic,
+            "papers": entry["papers"],
+            "updated": datetime.fromtimestamp(entry["updated"]).isoformat(timespec="seconds"),
+        }
+        for topic, entry in sorted(topics.items(), key=lambda item: item[1]["updated"], reverse=True)
+    ]
+
 
 if __name__ == "__main__":
+    # Rebuild stale index entries before serving requests
+    store.load()
+    catalog.start()
     # Initialize and run the server
     mcp.run(transport='stdio')
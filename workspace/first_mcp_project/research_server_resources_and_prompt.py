@@ -1,17 +1,161 @@
 import arxiv
+import asyncio
 import json
 import os
-from typing import List
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs
 from mcp.server.fastmcp import FastMCP
+from mcp.server.session import ServerSession
+from pydantic import AnyUrl
+from arxiv_client import AsyncArxivClient
+from local_search import BM25Index
+from paper_store import open_store
+from resource_cache import ResourceCache
+from search_cache import SearchCache
+from tfidf_index import TfidfIndex
+from topic_catalog import TopicCatalog
 
 PAPER_DIR = "papers"
 
+# 论文存储后端：PAPER_STORE=json（默认，每个主题一个 papers_info.json）或 sqlite
+store = open_store(PAPER_DIR)
+
+# 整个服务器生命周期共用一个 arXiv 客户端（连接池 + keep-alive）
+arxiv_client = AsyncArxivClient()
+
+# 相同查询在 TTL 内直接返回已保存的论文 ID，不再访问 arXiv
+search_cache = SearchCache(
+    PAPER_DIR,
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "256")),
+)
+
+# 已保存论文的本地全文索引，首次 search_local 时构建，之后随写入增量更新
+local_index = BM25Index()
+
+# related_papers 用的摘要 TF-IDF 矩阵，持久化在 papers/.tfidf/
+tfidf_index = TfidfIndex(PAPER_DIR)
+
+# 主题目录（论文数、最后更新时间），由后台 inotify 监视保持最新
+catalog = TopicCatalog(store, PAPER_DIR)
+
+# 渲染好的 papers:// 资源，按来源文件的 stat 判断是否过期
+resource_cache = ResourceCache(max_bytes=int(os.getenv("RESOURCE_CACHE_BYTES", str(8 * 1024 * 1024))))
+
 # Initialize FastMCP server
 mcp = FastMCP("research")
 
+# 资源订阅：uri -> 订阅了它的客户端会话；主题有变化时发 resources/updated 通知
+subscriptions: Dict[str, Set[ServerSession]] = {}
+server_loop: Optional[asyncio.AbstractEventLoop] = None
+
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_resource(uri: AnyUrl) -> None:
+    global server_loop
+    server_loop = asyncio.get_running_loop()
+    subscriptions.setdefault(str(uri), set()).add(mcp._mcp_server.request_context.session)
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri: AnyUrl) -> None:
+    sessions = subscriptions.get(str(uri))
+    if sessions is not None:
+        sessions.discard(mcp._mcp_server.request_context.session)
+        if not sessions:
+            del subscriptions[str(uri)]
+
+# 底层 Server 总是声明 subscribe=False，注册了处理函数后改为如实声明
+_get_capabilities = mcp._mcp_server.get_capabilities
+
+def get_capabilities(*args, **kwargs):
+    capabilities = _get_capabilities(*args, **kwargs)
+    if capabilities.resources is not None:
+        capabilities.resources.subscribe = True
+    return capabilities
+
+mcp._mcp_server.get_capabilities = get_capabilities
+
+def affected_uris(topic: str) -> List[str]:
+    """Subscribed URIs whose content depends on the given topic."""
+    uris = []
+    for uri in subscriptions:
+        if not uri.startswith("papers://"):
+            continue
+        name = uri[len("papers://"):].partition("?")[0]
+        if name == "folders" or name.lower().replace(" ", "_") == topic:
+            uris.append(uri)
+    return uris
+
+async def notify_resources_updated(topic: str) -> None:
+    for uri in affected_uris(topic):
+        for session in list(subscriptions.get(uri, ())):
+            try:
+                await session.send_resource_updated(AnyUrl(uri))
+            except Exception:
+                # 客户端已断开，不再通知它
+                subscriptions.get(uri, set()).discard(session)
+
+def on_topic_changed(topic: str) -> None:
+    # 可能在 inotify 监视线程里调用，通知要交给服务器的事件循环发送
+    if server_loop is None or not subscriptions:
+        return
+    asyncio.run_coroutine_threadsafe(notify_resources_updated(topic), server_loop)
+
+catalog.add_listener(on_topic_changed)
+
+def save_papers(topic: str, papers: List[arxiv.Result]) -> List[str]:
+    """
+    Merge arXiv results into the topic's store with a single write.
+    
+    Returns:
+        List of the stored paper IDs, in result order
+    """
+    topic_dir = topic.lower().replace(" ", "_")
+
+    # Process each paper and collect its info
+    paper_ids = []
+    papers_info = {}
+    for paper in papers:
+        paper_id = paper.entry_id.split('/')[-1]
+        paper_ids.append(paper_id)
+        paper_info = {
+            'title': paper.title,
+            'authors': [author.name for author in paper.authors],
+            'summary': paper.summary,
+            'pdf_url': paper.pdf_url,
+            'published': str(paper.published.date()) if paper.published else 'Unknown'
+        }
+        papers_info[paper_id] = paper_info
+    
+    location = store.add_papers(topic_dir, papers_info)
+    local_index.add_papers(papers_info)
+    tfidf_index.mark_dirty(store)
+    catalog.update(topic_dir)
+    resource_cache.invalidate(f"papers://{topic_dir}?")
+    resource_cache.invalidate("papers://folders")
+    print(f"结果保存在: {location}", file=sys.stderr)
+    return paper_ids
+
+def save_search(topic: str, max_results: int, papers: List[arxiv.Result]) -> List[str]:
+    """
+    Store a search's papers and remember its result IDs in the search cache.
+
+    Both writes block (the topic append takes the topic's file lock, the
+    search cache is an fsync'ing atomic write), so callers run this in a
+    worker thread.
+
+    Returns:
+        List of the stored paper IDs, in result order
+    """
+    paper_ids = save_papers(topic, papers)
+    search_cache.put(topic, max_results, paper_ids)
+    return paper_ids
+
 # 工具函数保持不变
 @mcp.tool()
-def search_papers(topic: str, max_results: int = 5) -> List[str]:
+async def search_papers(topic: str, max_results: int = 5) -> List[str]:
     """
     Search for papers on arXiv based on a topic and store their information.
     
@@ -23,10 +167,11 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         List of paper IDs found in the search
     """
     
-    try:
-        # Use arxiv to find the papers 
-        client = arxiv.Client()
+    cached_ids = search_cache.get(topic, max_results)
+    if cached_ids is not None:
+        return cached_ids
 
+    try:
         # Search for the most relevant articles matching the queried topic
         search = arxiv.Search(
             query=topic,
@@ -34,51 +179,72 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
             sort_by=arxiv.SortCriterion.Relevance
         )
 
-        papers = list(client.results(search))
-        
-        # Create directory for this topic
-        path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-        os.makedirs(path, exist_ok=True)
-        
-        file_path = os.path.join(path, "papers_info.json")
-
-        # Try to load existing papers info
-        try:
-            with open(file_path, "r", encoding='utf-8') as json_file:
-                papers_info = json.load(json_file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            papers_info = {}
-
-        # Process each paper and add to papers_info  
-        paper_ids = []
-        for paper in papers:
-            paper_id = paper.entry_id.split('/')[-1]
-            paper_ids.append(paper_id)
-            paper_info = {
-                'title': paper.title,
-                'authors': [author.name for author in paper.authors],
-                'summary': paper.summary,
-                'pdf_url': paper.pdf_url,
-                'published': str(paper.published.date()) if paper.published else 'Unknown'
-            }
-            papers_info[paper_id] = paper_info
+        # Use the shared client; the event loop keeps serving other requests meanwhile
+        papers = await arxiv_client.search(search)
         
-        # Save updated papers_info to json file
-        with open(file_path, "w", encoding='utf-8') as json_file:
-            json.dump(papers_info, json_file, indent=2, ensure_ascii=False)
+        # Merge the new papers into the topic store and cache the result IDs off the event loop
+        paper_ids = await asyncio.to_thread(save_search, topic, max_results, papers)
         
-        print(f"成功搜索到 {len(papers)} 篇论文")
-        print(f"结果保存在: {file_path}")
+        print(f"成功搜索到 {len(papers)} 篇论文", file=sys.stderr)
         
         return paper_ids
         
     except Exception as e:
-        print(f"搜索论文时出错: {e}")
-        print("请检查网络连接或稍后重试")
+        print(f"搜索论文时出错: {e}", file=sys.stderr)
+        print("请检查网络连接或稍后重试", file=sys.stderr)
         return []
 
 @mcp.tool()
-def extract_info(paper_id: str) -> str:
+async def search_papers_batch(topics: List[str], max_results: int = 5) -> Dict[str, List[str]]:
+    """
+    Search for papers on arXiv for several topics at once and store their information.
+    
+    Args:
+        topics: The topics to search for
+        max_results: Maximum number of results to retrieve per topic (default: 5)
+        
+    Returns:
+        Mapping of each topic to the list of paper IDs found for it
+    """
+    
+    # 只差大小写或空格的主题落在同一个目录里，按目录名去重，每个只搜索一次
+    unique = {}
+    for topic in topics:
+        unique.setdefault(topic.lower().replace(" ", "_"), topic)
+
+    results = {}
+    pending = []
+    for topic_dir, topic in unique.items():
+        cached_ids = search_cache.get(topic, max_results)
+        if cached_ids is not None:
+            results[topic_dir] = cached_ids
+        else:
+            pending.append((topic_dir, topic))
+
+    # 按 arXiv 的礼貌间隔流水线式发出请求，不必等上一个响应返回
+    searches = [
+        arxiv.Search(query=topic, max_results=max_results, sort_by=arxiv.SortCriterion.Relevance)
+        for _, topic in pending
+    ]
+    fetched = await arxiv_client.search_many(searches)
+
+    for (topic_dir, topic), papers in zip(pending, fetched):
+        if isinstance(papers, Exception):
+            print(f"搜索 {topic} 的论文时出错: {papers}", file=sys.stderr)
+            results[topic_dir] = []
+            continue
+        # One write per topic; a failed write only loses this topic's results
+        try:
+            results[topic_dir] = await asyncio.to_thread(save_search, topic, max_results, papers)
+        except Exception as e:
+            print(f"保存 {topic} 的论文时出错: {e}", file=sys.stderr)
+            results[topic_dir] = []
+
+    print(f"成功搜索了 {len(unique)} 个主题，其中 {len(pending)} 个访问了 arXiv", file=sys.stderr)
+    return {topic: results[topic.lower().replace(" ", "_")] for topic in topics}
+
+@mcp.tool()
+async def extract_info(paper_id: str) -> str:
     """
     Search for information about a specific paper across all topic directories.
     
@@ -88,23 +254,72 @@ def extract_info(paper_id: str) -> str:
     Returns:
         JSON string with paper information if found, error message if not found
     """
- 
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r", encoding='utf-8') as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2, ensure_ascii=False)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+
+    paper_info = await asyncio.to_thread(store.get_paper, paper_id)
+    if paper_info is not None:
+        return json.dumps(paper_info, indent=2, ensure_ascii=False)
     
     return f"没有找到与论文 {paper_id} 相关的保存信息。"
 
+@mcp.tool()
+async def search_local(query: str, k: int = 10) -> List[str]:
+    """
+    Search the papers already stored locally, ranked by BM25 over title, summary and authors.
+    
+    Args:
+        query: Free-text query
+        k: Maximum number of paper IDs to return (default: 10)
+        
+    Returns:
+        List of matching paper IDs, best match first
+    """
+
+    if not local_index.built:
+        # 只有第一次需要读取全部主题
+        await asyncio.to_thread(local_index.build, store)
+    return [paper_id for paper_id, _ in local_index.search(query, k)]
+
+@mcp.tool()
+async def related_papers(paper_id: str, k: int = 5) -> List[str]:
+    """
+    Find the stored papers most similar to a given paper, by cosine similarity of their summaries.
+    
+    Args:
+        paper_id: The ID of a stored paper
+        k: Maximum number of related paper IDs to return (default: 5)
+        
+    Returns:
+        List of related paper IDs, most similar first (empty if the paper is not stored)
+    """
+
+    related = await asyncio.to_thread(tfidf_index.related, store, paper_id, k)
+    if related is None:
+        print(f"没有找到与论文 {paper_id} 相关的保存信息。", file=sys.stderr)
+        return []
+    return [related_id for related_id, _ in related]
+
+@mcp.tool()
+async def recent_topics(hours: float = 24) -> List[dict]:
+    """
+    List the stored topics that received papers within the last few hours.
+    
+    Args:
+        hours: How far back to look, in hours (default: 24)
+        
+    Returns:
+        List of {"topic", "papers", "updated"} entries, most recently updated first
+    """
+
+    topics = catalog.updated_since(time.time() - hours * 3600)
+    return [
+        {
+            "topic": topic,
+            "papers": entry["papers"],
+            "updated": datetime.fromtimestamp(entry["updated"]).isoformat(timespec="seconds"),
+        }
+        for topic, entry in sorted(topics.items(), key=lambda item: item[1]["updated"], reverse=True)
+    ]
+
 @mcp.resource("papers://folders")
 def get_available_folders() -> str:
     """
@@ -112,63 +327,120 @@ def get_available_folders() -> str:
     
     This resource provides a simple list of all available topic folders.
     """
-    folders = []
-    
-    # Get all topic directories
-    if os.path.exists(PAPER_DIR):
-        for topic_dir in os.listdir(PAPER_DIR):
-            topic_path = os.path.join(PAPER_DIR, topic_dir)
-            if os.path.isdir(topic_path):
-                papers_file = os.path.join(topic_path, "papers_info.json")
-                if os.path.exists(papers_file):
-                    folders.append(topic_dir)
+    version = ("catalog", catalog.generation)
+    cached = resource_cache.get("papers://folders", version)
+    if cached is not None:
+        return cached
+
+    # Topics from the in-memory catalog, most recently updated first
+    folders = catalog.list_topics()
     
     # Create a simple markdown list
     content = "# Available Topics\n\n"
     if folders:
         for folder in folders:
-            content += f"- {folder}\n"
+            entry = catalog.get(folder)
+            if entry is None:
+                continue
+            updated = datetime.fromtimestamp(entry["updated"]).strftime("%Y-%m-%d %H:%M")
+            content += f"- {folder} ({entry['papers']} papers, updated {updated})\n"
         content += f"\nUse @{folder} to access papers in that topic.\n"
     else:
         content += "No topics found.\n"
     
+    resource_cache.put("papers://folders", version, content)
     return content
 
+# papers://{topic} 每页默认/最多返回的论文数
+TOPIC_PAGE_SIZE = 20
+TOPIC_PAGE_MAX = 100
+TOPIC_FIELDS = ("title", "authors", "published", "pdf_url", "summary")
+
+def render_topic_page(topic: str, total: int, offset: int, papers: Dict[str, dict],
+                      fields: List[str], next_uri: Optional[str]) -> str:
+    """Render one page of a topic as markdown, built from a list of parts."""
+    parts = [f"# Papers on {topic.replace('_', ' ').title()}\n\n"]
+    if papers:
+        parts.append(f"Total papers: {total} (showing {offset + 1}-{offset + len(papers)})\n\n")
+    else:
+        parts.append(f"Total papers: {total} (no papers at cursor {offset})\n\n")
+
+    for paper_id, paper_info in papers.items():
+        parts.append(f"## {paper_info['title']}\n" if "title" in fields else f"## {paper_id}\n")
+        parts.append(f"- **Paper ID**: {paper_id}\n")
+        if "authors" in fields:
+            parts.append(f"- **Authors**: {', '.join(paper_info['authors'])}\n")
+        if "published" in fields:
+            parts.append(f"- **Published**: {paper_info['published']}\n")
+        if "pdf_url" in fields:
+            parts.append(f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n")
+        parts.append("\n")
+        if "summary" in fields:
+            parts.append(f"### Summary\n{paper_info['summary'][:500]}...\n\n")
+        parts.append("---\n\n")
+
+    if next_uri is not None:
+        parts.append(f"Next page: {next_uri}\n")
+    return "".join(parts)
+
 @mcp.resource("papers://{topic}")
 def get_topic_papers(topic: str) -> str:
     """
-    Get detailed information about papers on a specific topic.
+    Get detailed information about papers on a specific topic, one page at a time.
     
     Args:
-        topic: The research topic to retrieve papers for
+        topic: The research topic to retrieve papers for, optionally followed by
+            ?cursor=<cursor>&limit=<page size>&fields=<comma separated fields>
+            (fields: title, authors, published, pdf_url, summary)
     """
+    # 模板参数匹配到的是 "/" 之前的全部内容，查询串也在里面
+    topic, _, query = topic.partition("?")
+    params = parse_qs(query)
+    try:
+        offset = max(int(params.get("cursor", ["0"])[0]), 0)
+        limit = min(max(int(params.get("limit", [str(TOPIC_PAGE_SIZE)])[0]), 1), TOPIC_PAGE_MAX)
+    except ValueError:
+        return f"# Invalid cursor or limit for topic: {topic}\n\nBoth must be integers."
+    fields = params.get("fields", [",".join(TOPIC_FIELDS)])[0].split(",")
+    fields = [field for field in fields if field in TOPIC_FIELDS]
+
     topic_dir = topic.lower().replace(" ", "_")
-    papers_file = os.path.join(PAPER_DIR, topic_dir, "papers_info.json")
-    
-    if not os.path.exists(papers_file):
-        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
+    # next_uri 沿用请求里的主题写法以及是否显式给了 fields，二者也要进缓存键；
+    # 键仍以 papers://{topic_dir}? 开头，写入时按前缀失效
+    uri = (f"papers://{topic_dir}?cursor={offset}&limit={limit}&fields={','.join(fields)}"
+           f"&topic={topic}&explicit_fields={int('fields' in params)}")
+    version = store.version(topic_dir)
+    cached = resource_cache.get(uri, version)
+    if cached is not None:
+        return cached
     
     try:
-        with open(papers_file, 'r') as f:
-            papers_data = json.load(f)
-        
-        # Create markdown content with paper details
-        content = f"# Papers on {topic.replace('_', ' ').title()}\n\n"
-        content += f"Total papers: {len(papers_data)}\n\n"
-        
-        for paper_id, paper_info in papers_data.items():
-            content += f"## {paper_info['title']}\n"
-            content += f"- **Paper ID**: {paper_id}\n"
-            content += f"- **Authors**: {', '.join(paper_info['authors'])}\n"
-            content += f"- **Published**: {paper_info['published']}\n"
-            content += f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
-            content += f"### Summary\n{paper_info['summary'][:500]}...\n\n"
-            content += "---\n\n"
+        page = store.get_topic_page(topic_dir, offset, limit)
+        if page is None:
+            return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
         
+        total, papers_data = page
+        next_uri = None
+        if offset + limit < total:
+            next_uri = f"papers://{topic}?cursor={offset + limit}&limit={limit}"
+            if "fields" in params:
+                next_uri += f"&fields={','.join(fields)}"
+        content = render_topic_page(topic_dir, total, offset, papers_data, fields, next_uri)
+        resource_cache.put(uri, version, content)
         return content
     except json.JSONDecodeError:
         return f"# Error reading papers data for {topic}\n\nThe papers data file is corrupted."
 
+@mcp.resource("stats://cache")
+def get_cache_stats() -> str:
+    """
+    Report hit/miss counters of the server-side caches.
+    """
+    return json.dumps(
+        {"search_cache": search_cache.stats(), "resource_cache": resource_cache.stats()},
+        indent=2,
+    )
+
 @mcp.prompt()
 def generate_search_prompt(topic: str, num_papers: int = 5) -> str:
     """Generate a prompt for Claude to find and discuss academic papers on a specific topic."""
@@ -195,5 +467,8 @@ def generate_search_prompt(topic: str, num_papers: int = 5) -> str:
 
 
 if __name__ == "__main__":
+    # Rebuild stale index entries before serving requests
+    store.load()
+    catalog.start()
     # Initialize and run the server
     mcp.run(transport='stdio')
@@ -0,0 +1,72 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+
+class ResourceCache:
+    """
+    In-memory LRU cache of rendered resource text, bounded by total size.
+
+    Each entry is keyed by URI and remembers the source version it was
+    rendered from (see PaperStore.version); a read with a different version
+    is a miss. Writes through search_papers also drop the affected entries
+    explicitly via invalidate().
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[Hashable, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uri: str, version: Optional[Hashable]) -> Optional[str]:
+        """Return the cached text for uri if it was rendered from this version."""
+        with self._lock:
+            entry = self._entries.get(uri)
+            if version is None or entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(uri)
+            self.hits += 1
+            return entry[1]
+
+    def _drop(self, uri: str) -> None:
+        self.size -= self._entries.pop(uri)[2]
+
+    def put(self, uri: str, version: Optional[Hashable], text: str) -> None:
+        if version is None:
+            return
+        size = len(text.encode("utf-8"))
+        # 单个结果超过上限就不缓存，免得把其他条目全部挤掉
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if uri in self._entries:
+                self._drop(uri)
+            self._entries[uri] = (version, text, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, prefix: str = "") -> None:
+        """Drop every entry whose URI starts with prefix (all entries by default)."""
+        with self._lock:
+            for uri in [uri for uri in self._entries if uri.startswith(prefix)]:
+                self._drop(uri)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
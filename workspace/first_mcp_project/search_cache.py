@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from topic_lock import atomic_write
+
+SEARCH_CACHE_FILE = ".search_cache.json"
+
+
+class SearchCache:
+    """
+    On-disk cache of search_papers results with TTL and LRU eviction.
+
+    Entries map a normalized (query, max_results, sort) key to the paper IDs
+    that search returned. The whole cache is kept in memory, so a hit is a
+    dict lookup; the file is only rewritten when an entry is added, and its
+    size is bounded by max_entries.
+    """
+
+    def __init__(self, paper_dir: str, ttl_seconds: float = 3600, max_entries: int = 256):
+        self.path = os.path.join(paper_dir, SEARCH_CACHE_FILE)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, max_results: int, sort_by: str = "relevance") -> str:
+        # 大小写和多余空白不影响 arXiv 的检索结果
+        normalized = " ".join(query.lower().split())
+        return f"{normalized}|{max_results}|{sort_by}"
+
+    def _load(self) -> None:
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        # 文件里按最近使用顺序保存
+        for key, entry in data.items():
+            self._entries[key] = entry
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        atomic_write(self.path, json.dumps(self._entries, ensure_ascii=False).encode("utf-8"))
+
+    def get(self, query: str, max_results: int, sort_by: str = "relevance") -> Optional[List[str]]:
+        """
+        Return the cached paper IDs for a search, or None on a miss or expired entry.
+        """
+        key = self.make_key(query, max_results, sort_by)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry["paper_ids"])
+
+    def put(self, query: str, max_results: int, paper_ids: List[str], sort_by: str = "relevance") -> None:
+        """Store the paper IDs returned by a search and persist the cache."""
+        key = self.make_key(query, max_results, sort_by)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._entries[key] = {"paper_ids": list(paper_ids), "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._save()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
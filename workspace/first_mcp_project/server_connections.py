@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+
+from topic_lock import atomic_write
+
+# 单个服务器从启动进程到列出工具的最长等待时间（秒），可在配置里用 connect_timeout 覆盖
+CONNECT_TIMEOUT = float(os.getenv("MCP_CONNECT_TIMEOUT", "30"))
+
+# 懒启动：有能力快照的服务器在第一次被调用时才启动进程；默认关闭，MCP_LAZY_START=1 开启
+LAZY_START = os.getenv("MCP_LAZY_START", "0") == "1"
+SNAPSHOT_FILE = ".mcp_capabilities.json"
+
+
+def config_hash(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+async def list_capabilities(session: ClientSession) -> dict:
+    """Tools, prompts and resources of a server, as JSON-compatible dicts."""
+    capabilities = session.get_server_capabilities()
+    snapshot = {"tools": [], "prompts": [], "resources": []}
+    if capabilities is None or capabilities.tools is not None:
+        snapshot["tools"] = [t.model_dump(mode="json") for t in (await session.list_tools()).tools]
+    if capabilities is None or capabilities.prompts is not None:
+        snapshot["prompts"] = [p.model_dump(mode="json") for p in (await session.list_prompts()).prompts]
+    if capabilities is None or capabilities.resources is not None:
+        snapshot["resources"] = [r.model_dump(mode="json") for r in (await session.list_resources()).resources]
+    return snapshot
+
+
+class CapabilitySnapshots:
+    """
+    Per-server capability snapshots in one JSON file, keyed by a hash of the
+    server's config entry, so editing a server's command invalidates it.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_FILE):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._snapshots = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._snapshots = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._snapshots.get(key)
+
+    def put(self, key: str, snapshot: dict) -> None:
+        if self._snapshots.get(key) == snapshot:
+            return
+        self._snapshots[key] = snapshot
+        try:
+            atomic_write(self.path, json.dumps(self._snapshots, ensure_ascii=False, indent=2).encode("utf-8"))
+        except OSError as e:
+            print(f"Failed to save capability snapshot: {e}")
+
+
+class ServerConnection:
+    """
+    One stdio MCP server, owned by its own long-lived task.
+
+    stdio_client and ClientSession use anyio task groups, which must be
+    entered and exited by the same task, so they cannot simply be pushed onto
+    a shared AsyncExitStack from several concurrent tasks. Here a dedicated
+    task enters both contexts, hands the initialized session back, and keeps
+    them open until close() is called. Notifications from the server are
+    passed to message_handler(connection, message) if one is given.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: dict,
+        message_handler: Optional[Callable[["ServerConnection", Any], Awaitable[None]]] = None,
+    ):
+        self.key = config_hash(config)
+        config = dict(config)
+        self.name = name
+        self.timeout = float(config.pop("connect_timeout", CONNECT_TIMEOUT))
+        self.params = StdioServerParameters(**config)
+        self.message_handler = message_handler
+        self.session: Optional[ClientSession] = None
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.elapsed = 0.0
+        self.result: Any = None
+        # 调用工具时使用的对象：已连接时是 session，懒启动时是 LazySession
+        self.client: Any = None
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with stdio_client(self.params) as (read, write):
+                handler = None
+                if self.message_handler is not None:
+                    async def handler(message) -> None:
+                        await self.message_handler(self, message)
+                async with ClientSession(read, write, message_handler=handler) as session:
+                    await session.initialize()
+                    ready.set_result(session)
+                    await self._closing.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            if not ready.done():
+                ready.cancel()
+
+    async def connect(self, setup: Optional[Callable[[str, ClientSession], Awaitable[Any]]] = None) -> None:
+        """
+        Start the server and initialize the session within self.timeout, then
+        await setup(name, session) (e.g. listing tools) under the same deadline.
+        Never raises: the outcome is recorded in status/error/elapsed.
+        """
+        if self._task is not None:
+            # 上一次失败的连接只发出了取消，先等它退出，免得旧任务和子进程泄漏
+            await self.close()
+        start = time.perf_counter()
+        self.error = None
+        self._closing = asyncio.Event()
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready), name=f"mcp-server-{self.name}")
+
+        async def start_and_setup():
+            self.session = await ready
+            if setup is not None:
+                self.result = await setup(self.name, self.session)
+
+        try:
+            await asyncio.wait_for(start_and_setup(), self.timeout)
+            self.status = "ok"
+            self.client = self.session
+        except asyncio.TimeoutError:
+            self.status = "timeout"
+            self.error = f"no response within {self.timeout:.0f}s"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e) or type(e).__name__
+        self.elapsed = time.perf_counter() - start
+        if self.status != "ok":
+            # 只发出取消，不等子进程退出，免得拖慢其他服务器；close() 时再回收
+            self.session = None
+            self._closing.set()
+            self._task.cancel()
+
+    async def close(self) -> None:
+        """Leave the session and stdio contexts from their owning task."""
+        if self._task is None:
+            return
+        self._closing.set()
+        if self.session is None:
+            # 还没初始化完成，直接取消
+            self._task.cancel()
+        try:
+            await asyncio.wait_for(self._task, 5)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        self.session = None
+
+
+class LazySession:
+    """
+    Stand-in for a ClientSession of a server that has not been started yet.
+
+    list_tools/list_prompts/list_resources are answered from the capability
+    snapshot; the first call_tool/get_prompt/read_resource starts the server
+    (once, even if several calls race), forwards the call, and refreshes the
+    snapshot from the live server.
+    """
+
+    def __init__(self, connection: ServerConnection, snapshot: dict, snapshots: CapabilitySnapshots):
+        self.connection = connection
+        self.snapshot = snapshot
+        self.snapshots = snapshots
+        self._lock = asyncio.Lock()
+
+    async def list_tools(self) -> types.ListToolsResult:
+        return types.ListToolsResult(tools=[types.Tool.model_validate(t) for t in self.snapshot["tools"]])
+
+    async def list_prompts(self) -> types.ListPromptsResult:
+        return types.ListPromptsResult(prompts=[types.Prompt.model_validate(p) for p in self.snapshot["prompts"]])
+
+    async def list_resources(self) -> types.ListResourcesResult:
+        return types.ListResourcesResult(
+            resources=[types.Resource.model_validate(r) for r in self.snapshot["resources"]]
+        )
+
+    async def _session(self) -> ClientSession:
+        async with self._lock:
+            if self.connection.session is None:
+                print(f"Starting {self.connection.name} on first use...")
+
+                async def refresh(name: str, session: ClientSession) -> None:
+                    self.snapshot = await list_capabilities(session)
+                    self.snapshots.put(self.connection.key, self.snapshot)
+
+                await self.connection.connect(refresh)
+                if self.connection.session is None:
+                    error = self.connection.error
+                    await self.connection.close()
+                    raise RuntimeError(f"Failed to start {self.connection.name}: {error}")
+                print(f"Started {self.connection.name} in {self.connection.elapsed:.2f}s")
+            return self.connection.session
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None, **kwargs) -> types.CallToolResult:
+        return await (await self._session()).call_tool(name, arguments=arguments, **kwargs)
+
+    async def get_prompt(self, name: str, arguments: Optional[dict] = None) -> types.GetPromptResult:
+        return await (await self._session()).get_prompt(name, arguments=arguments)
+
+    async def read_resource(self, uri) -> types.ReadResourceResult:
+        return await (await self._session()).read_resource(uri)
+
+    async def subscribe_resource(self, uri) -> types.EmptyResult:
+        return await (await self._session()).subscribe_resource(uri)
+
+    async def unsubscribe_resource(self, uri) -> types.EmptyResult:
+        return await (await self._session()).unsubscribe_resource(uri)
+
+
+async def connect_all(
+    servers: Dict[str, dict],
+    setup: Optional[Callable[[str, Any], Awaitable[Any]]] = None,
+    lazy: bool = LAZY_START,
+    message_handler: Optional[Callable[[ServerConnection, Any], Awaitable[None]]] = None,
+) -> Dict[str, ServerConnection]:
+    """
+    Connect to every configured server concurrently.
+
+    With lazy=True, servers that have a capability snapshot are not started:
+    setup() receives a LazySession instead and returns in milliseconds.
+    Servers without a snapshot are started right away and their snapshot is
+    saved for the next run. message_handler receives the notifications of
+    every server (see ServerConnection).
+
+    Returns:
+        name -> ServerConnection in config order, including the ones that
+        failed or timed out (their client is None)
+    """
+    snapshots = CapabilitySnapshots()
+    connections = {}
+    for name, config in servers.items():
+        try:
+            connections[name] = ServerConnection(name, config, message_handler)
+        except Exception as e:
+            print(f"Invalid configuration for {name}: {e}")
+
+    async def start(connection: ServerConnection) -> None:
+        snapshot = snapshots.get(connection.key) if lazy else None
+        if snapshot is not None:
+            begin = time.perf_counter()
+            connection.client = LazySession(connection, snapshot, snapshots)
+            connection.status = "lazy"
+            try:
+                if setup is not None:
+                    connection.result = await setup(connection.name, connection.client)
+            except Exception as e:
+                connection.client = None
+                connection.status = "failed"
+                connection.error = str(e)
+            connection.elapsed = time.perf_counter() - begin
+            return
+
+        async def snapshot_and_setup(name: str, session: ClientSession) -> Any:
+            snapshots.put(connection.key, await list_capabilities(session))
+            return await setup(name, session) if setup is not None else None
+
+        await connection.connect(snapshot_and_setup)
+
+    await asyncio.gather(*(start(connection) for connection in connections.values()))
+    return connections
+
+
+def print_startup_report(connections: Dict[str, ServerConnection], total: float) -> None:
+    """Print per-server startup latency next to the overall wall time."""
+    print("\nServer startup:")
+    for connection in connections.values():
+        line = f"  {connection.name:<16} {connection.status:<8} {connection.elapsed:6.2f}s"
+        if connection.error:
+            line += f"  ({connection.error})"
+        print(line)
+    serial = sum(connection.elapsed for connection in connections.values())
+    print(f"  {'total':<16} {'':<8} {total:6.2f}s (sequential would be ~{serial:.2f}s)")
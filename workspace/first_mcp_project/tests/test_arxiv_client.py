@@ -0,0 +1,57 @@
+"""
+Checks for the async arXiv client's URL building and feed parsing.
+
+Run from first_mcp_project: python -m pytest tests, or python -m tests.test_arxiv_client
+"""
+import os
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import arxiv
+
+from arxiv_client import AsyncArxivClient
+
+FEED = os.path.join(os.path.dirname(__file__), "data", "arxiv_feed.xml")
+
+
+def test_parse_recorded_feed():
+    with open(FEED, "rb") as f:
+        results = AsyncArxivClient._parse(f.read())
+
+    # 第三个条目是 arXiv 的错误条目，没有发布时间，要被跳过
+    assert [r.entry_id for r in results] == [
+        "http://arxiv.org/abs/1706.03762v7",
+        "http://arxiv.org/abs/2205.14135v2",
+    ]
+    first, second = results
+    assert first.title == "Attention Is All You Need"
+    assert [a.name for a in first.authors] == ["Ashish Vaswani", "Noam Shazeer"]
+    assert first.summary.startswith("The dominant sequence transduction models")
+    assert first.pdf_url == "http://arxiv.org/pdf/1706.03762v7"
+    assert first.published == datetime(2017, 6, 12, 17, 57, 34, tzinfo=timezone.utc)
+    assert first.updated == datetime(2023, 8, 2, 0, 41, 18, tzinfo=timezone.utc)
+    assert first.comment == "15 pages, 5 figures"
+    assert first.primary_category == "cs.CL"
+    assert first.categories == ["cs.CL", "cs.LG"]
+    assert second.doi == "10.48550/arXiv.2205.14135"
+    assert second.get_short_id() == "2205.14135v2"
+
+
+def test_format_url():
+    client = AsyncArxivClient(api_url="http://127.0.0.1:1/api/query")
+    url = client._format_url(arxiv.Search(query="all:attention", max_results=5))
+    args = parse_qs(urlparse(url).query, keep_blank_values=True)
+    assert args == {
+        "search_query": ["all:attention"],
+        "id_list": [""],
+        "sortBy": ["relevance"],
+        "sortOrder": ["descending"],
+        "start": ["0"],
+        "max_results": ["5"],
+    }
+
+
+if __name__ == "__main__":
+    test_parse_recorded_feed()
+    test_format_url()
+    print("ok")
@@ -0,0 +1,62 @@
+"""
+Checks that context elision keeps the prompt-cache prefix stable.
+
+Run from first_mcp_project: python -m pytest tests/test_context_budget.py
+"""
+import json
+
+from context_budget import ContextBudget
+from prompt_cache import with_cache_breakpoints
+
+
+def add_turn(messages: list, n: int, tokens: int = 1000) -> None:
+    tool_use_id = f"toolu_{n}"
+    messages.append({"role": "assistant", "content": [
+        {"type": "tool_use", "id": tool_use_id, "name": "extract_info", "input": {"paper_id": str(n)}},
+    ]})
+    messages.append({"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": tool_use_id, "content": f"paper {n} " + "x" * (tokens * 4)},
+    ]})
+
+
+def dump(messages: list) -> str:
+    return json.dumps(messages, ensure_ascii=False, sort_keys=True)
+
+
+def test_prefix_up_to_previous_breakpoint_is_stable():
+    context = ContextBudget(max_tokens=6000, keep_recent=2)
+    messages = [{"role": "user", "content": "find papers"}]
+    for n in range(7):
+        add_turn(messages, n)
+
+    # 第一次请求超出预算，裁掉一批
+    _, first = with_cache_breakpoints([], context.prepare(messages))
+    assert len(context.elided) > 1
+
+    # 下一轮只追加：上一次断点之前的内容逐字节不变
+    add_turn(messages, 7)
+    _, second = with_cache_breakpoints([], context.prepare(messages))
+    marked = len(first) - 1
+    assert dump(second[:marked]) == dump(first[:marked])
+    # 上一次带断点的消息，去掉标记后也一样
+    unmarked = dict(first[marked], content=[
+        {k: v for k, v in block.items() if k != "cache_control"} for block in first[marked]["content"]
+    ])
+    assert dump([second[marked]]) == dump([unmarked])
+
+
+def test_prefix_changes_only_when_a_batch_is_elided():
+    context = ContextBudget(max_tokens=6000, keep_recent=2)
+    messages = [{"role": "user", "content": "find papers"}]
+    previous = []
+    rewrites = 0
+    for n in range(30):
+        add_turn(messages, n)
+        elided = len(context.elided)
+        prepared = context.prepare(messages)
+        if dump(prepared[:len(previous)]) != dump(previous):
+            rewrites += 1
+            assert len(context.elided) > elided
+        previous = prepared
+    # 每批裁到预算的 60%，大约每三轮才改写一次前缀；逐个裁剪时超出预算后每轮都会改写
+    assert rewrites <= 30 // 2
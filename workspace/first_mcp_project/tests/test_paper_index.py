@@ -0,0 +1,106 @@
+"""
+Regression checks for the paper-ID index.
+
+Run from first_mcp_project: python -m pytest tests, or python -m tests.test_paper_index
+"""
+import os
+import shutil
+import tempfile
+
+from paper_store import JSONPaperStore
+
+PAPER = {"title": "Shared", "authors": ["A"], "summary": "s", "pdf_url": "u", "published": "2025-01-01"}
+
+
+def test_paper_in_two_topics_survives_dropping_one():
+    paper_dir = tempfile.mkdtemp()
+    try:
+        store = JSONPaperStore(paper_dir)
+        store.load()
+        store.add_papers("a", {"p1": PAPER})
+        store.add_papers("b", {"p1": dict(PAPER, title="Shared (b)")})
+        assert store.get_paper("p1")["title"] == "Shared (b)"
+
+        shutil.rmtree(os.path.join(paper_dir, "b"))
+        assert store.get_paper("p1")["title"] == "Shared"
+
+        # 重新加载后（从索引日志重放）也要能找到
+        fresh = JSONPaperStore(paper_dir)
+        fresh.load()
+        assert fresh.get_paper("p1")["title"] == "Shared"
+        assert fresh.paper_count() == 1
+    finally:
+        shutil.rmtree(paper_dir)
+
+
+def test_topic_spans_point_into_their_own_topic():
+    paper_dir = tempfile.mkdtemp()
+    try:
+        store = JSONPaperStore(paper_dir)
+        store.load()
+        store.add_papers("a", {"p0": PAPER, "p1": PAPER})
+        store.add_papers("b", {"p1": PAPER})
+        # 压缩 a 会按 a 自己的 span 重写索引，不能用到 b 的偏移
+        store.index.compact_topic("a")
+        store.index._compact_index()
+        fresh = JSONPaperStore(paper_dir)
+        fresh.load()
+        shutil.rmtree(os.path.join(paper_dir, "b"))
+        assert fresh.get_paper("p1") == PAPER
+        assert fresh.get_topic_papers("a") == {"p0": PAPER, "p1": PAPER}
+    finally:
+        shutil.rmtree(paper_dir)
+
+
+def test_read_page_matches_read_topic():
+    paper_dir = tempfile.mkdtemp()
+    try:
+        store = JSONPaperStore(paper_dir)
+        store.load()
+        store.add_papers("t", {f"p{i}": dict(PAPER, title=f"T{i}") for i in range(5)})
+        store.index.compact_topic("t")
+        # 日志里既有新 ID，也有对快照里已有 ID 的更新
+        store.add_papers("t", {"p2": dict(PAPER, title="T2 updated"), "p5": PAPER})
+        store.add_papers("t", {f"p{i}": PAPER for i in range(6, 9)})
+        papers = store.get_topic_papers("t")
+        for offset, limit in ((0, 3), (2, 4), (7, 5), (9, 2)):
+            expected = dict(list(papers.items())[offset:offset + limit])
+            assert store.get_topic_page("t", offset, limit) == (len(papers), expected)
+        assert store.get_topic_page("missing", 0, 5) is None
+    finally:
+        shutil.rmtree(paper_dir)
+
+
+def test_miss_does_not_walk_topics():
+    paper_dir = tempfile.mkdtemp()
+    try:
+        store = JSONPaperStore(paper_dir)
+        store.load()
+        for i in range(20):
+            store.add_papers(f"t{i}", {f"p{i}": PAPER})
+        store.index.refresh()
+
+        calls = []
+        index = store.index
+        list_topics, stat = index.list_topics, index._stat
+        index.list_topics = lambda: calls.append("list") or list_topics()
+        index._stat = lambda topic: calls.append(topic) or stat(topic)
+        for _ in range(5):
+            assert store.get_paper("missing") is None
+        assert calls == []
+
+        # 别的进程新建的主题改变了索引日志的 stat，下一次未命中会刷新并找到它
+        other = JSONPaperStore(paper_dir)
+        other.load()
+        other.add_papers("new", {"p-new": PAPER})
+        assert store.get_paper("p-new") == PAPER
+    finally:
+        shutil.rmtree(paper_dir)
+
+
+if __name__ == "__main__":
+    test_paper_in_two_topics_survives_dropping_one()
+    test_topic_spans_point_into_their_own_topic()
+    test_read_page_matches_read_topic()
+    test_miss_does_not_walk_topics()
+    print("ok")
@@ -0,0 +1,125 @@
+"""
+Concurrent writers on the JSON papers store.
+
+Several processes, each with several threads, append papers to a small set
+of shared topics while reading them back. Afterwards every written paper
+must be found by get_paper and get_topic_papers, and every topic snapshot
+must parse. A tiny COMPACT_MIN_BYTES forces compaction to run concurrently.
+
+The default run is small enough for every test run; set STRESS_PAPER_STORE=1
+for the full 4 processes x 8 threads x 50 writes.
+
+Run from first_mcp_project: python -m pytest tests/test_paper_store_concurrency.py
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+import paper_index
+from paper_store import JSONPaperStore
+
+SCALES = {
+    "small": {"processes": 2, "threads": 4, "writes": 15, "topics": 3},
+    "full": {"processes": 4, "threads": 8, "writes": 50, "topics": 3},
+}
+
+
+def paper(worker: str, i: int) -> dict:
+    return {
+        "title": f"Paper {i} from {worker}",
+        "authors": [f"Author {worker}"],
+        "summary": "lorem ipsum " * 40,
+        "pdf_url": f"http://arxiv.org/pdf/{worker}.{i}",
+        "published": "2025-01-01",
+    }
+
+
+def run_worker(paper_dir: str, proc: int, threads: int, writes: int, topics: int, errors) -> None:
+    paper_index.COMPACT_MIN_BYTES = 4096
+    store = JSONPaperStore(paper_dir)
+    store.load()
+
+    def write(thread: int) -> None:
+        worker = f"p{proc}t{thread}"
+        try:
+            for i in range(writes):
+                topic = f"topic_{(thread + i) % topics}"
+                store.add_papers(topic, {f"{worker}-{i}": paper(worker, i)})
+                # 读自己刚写的，以及顺带读整个主题，和写入/合并交错进行
+                if store.get_paper(f"{worker}-{i}") is None:
+                    errors.put(f"{worker}-{i} not found right after write")
+                if i % 10 == 0:
+                    store.get_topic_papers(topic)
+        except Exception as e:
+            errors.put(f"{worker}: {e!r}")
+
+    pool = [threading.Thread(target=write, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    # 等后台合并线程结束，子进程退出前不能留下写了一半的快照
+    while store.index._compacting:
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize(
+    "scale",
+    [
+        "small",
+        pytest.param(
+            "full",
+            marks=pytest.mark.skipif(
+                os.getenv("STRESS_PAPER_STORE") != "1", reason="set STRESS_PAPER_STORE=1 for the full run"
+            ),
+        ),
+    ],
+)
+def test_concurrent_writers_lose_nothing(tmp_path, scale):
+    params = SCALES[scale]
+    paper_dir = str(tmp_path / "papers")
+    errors = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(paper_dir, p, params["threads"], params["writes"], params["topics"], errors),
+        )
+        for p in range(params["processes"])
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+
+    failures = []
+    while not errors.empty():
+        failures.append(errors.get())
+
+    # 用一个全新的实例（从磁盘重建索引）做最终校验
+    store = JSONPaperStore(paper_dir)
+    store.load()
+    for topic in store.list_topics():
+        snapshot = os.path.join(paper_dir, topic, paper_index.PAPERS_FILE)
+        if os.path.exists(snapshot):
+            try:
+                with open(snapshot, "r", encoding="utf-8") as f:
+                    json.load(f)
+            except json.JSONDecodeError as e:
+                failures.append(f"{snapshot} is corrupted: {e}")
+
+    topics = {t: store.get_topic_papers(t) or {} for t in store.list_topics()}
+    for p in range(params["processes"]):
+        for t in range(params["threads"]):
+            for i in range(params["writes"]):
+                paper_id, topic = f"p{p}t{t}-{i}", f"topic_{(t + i) % params['topics']}"
+                if paper_id not in topics.get(topic, {}):
+                    failures.append(f"{paper_id} missing from {topic}")
+                elif store.get_paper(paper_id) is None:
+                    failures.append(f"{paper_id} not found by get_paper")
+
+    assert failures == []
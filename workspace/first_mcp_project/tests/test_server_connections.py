@@ -0,0 +1,29 @@
+"""
+Checks for lazily started MCP server connections.
+
+Run from first_mcp_project: python -m pytest tests/test_server_connections.py
+"""
+import asyncio
+import sys
+
+import pytest
+
+from server_connections import CapabilitySnapshots, LazySession, ServerConnection
+
+SNAPSHOT = {"tools": [], "prompts": [], "resources": []}
+
+
+def test_failed_lazy_start_reaps_the_connection_task(tmp_path):
+    async def main():
+        # 进程能启动但不说 MCP，初始化会超时
+        config = {"command": sys.executable, "args": ["-c", "import time; time.sleep(60)"], "connect_timeout": 0.2}
+        connection = ServerConnection("broken", config)
+        session = LazySession(connection, SNAPSHOT, CapabilitySnapshots(str(tmp_path / "snapshots.json")))
+        before = asyncio.all_tasks()
+        for _ in range(2):
+            with pytest.raises(RuntimeError, match="Failed to start broken"):
+                await session.call_tool("anything")
+            assert connection._task is None
+            assert asyncio.all_tasks() == before
+
+    asyncio.run(main())
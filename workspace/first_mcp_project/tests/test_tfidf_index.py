@@ -0,0 +1,60 @@
+"""
+Checks for the TF-IDF related-papers index and its background rebuilds.
+
+Run from first_mcp_project: python -m pytest tests/test_tfidf_index.py
+"""
+import threading
+
+from paper_store import JSONPaperStore
+from tfidf_index import TfidfIndex
+
+
+def paper(summary: str) -> dict:
+    return {"title": summary, "authors": ["A"], "summary": summary, "pdf_url": "u", "published": "2025-01-01"}
+
+
+def test_queries_use_old_matrix_during_rebuild(tmp_path):
+    store = JSONPaperStore(str(tmp_path))
+    store.load()
+    store.add_papers("graphs", {
+        "g1": paper("graph neural network message passing"),
+        "g2": paper("graph attention network"),
+        "t1": paper("transformer attention language model"),
+    })
+    index = TfidfIndex(str(tmp_path))
+    assert [paper_id for paper_id, _ in index.related(store, "g1", 1)] == ["g2"]
+
+    # 卡住后台重建，查询照样用旧矩阵返回
+    started, release = threading.Event(), threading.Event()
+    builds = []
+    build = index._build
+
+    def slow_build(store):
+        builds.append(store)
+        started.set()
+        release.wait()
+        build(store)
+
+    index._build = slow_build
+    store.add_papers("graphs", {"g3": paper("graph neural network pooling")})
+    index.mark_dirty(store)
+    assert started.wait(5)
+    assert [paper_id for paper_id, _ in index.related(store, "g1", 1)] == ["g2"]
+
+    # 新论文不在旧矩阵里：查询等后台重建完成，而不是自己再建一次
+    release.set()
+    assert index.related(store, "g3", 1)[0][0] == "g1"
+    index.wait()
+    assert len(builds) == 1
+    assert index._built_gen == index._dirty_gen == 1
+
+    # 重启后直接映射保存的矩阵
+    fresh = TfidfIndex(str(tmp_path))
+    assert fresh.related(store, "g3", 1)[0][0] == "g1"
+
+
+def test_unknown_paper(tmp_path):
+    store = JSONPaperStore(str(tmp_path))
+    store.load()
+    store.add_papers("t", {"p1": paper("a b c")})
+    assert TfidfIndex(str(tmp_path)).related(store, "missing") is None
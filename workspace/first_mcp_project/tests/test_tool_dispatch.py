@@ -0,0 +1,62 @@
+"""
+Checks for the shared model/tool loop.
+
+Run from first_mcp_project: python -m pytest tests/test_tool_dispatch.py
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import tool_dispatch
+
+
+class SlowSession:
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    async def call_tool(self, name, arguments=None):
+        self.started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class BrokenStream:
+    """Yields one finished tool_use block, then the connection drops."""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self.events()
+
+    async def events(self):
+        block = SimpleNamespace(type="tool_use", id="toolu_1", name="search_papers", input={"topic": "x"})
+        yield SimpleNamespace(type="content_block_stop", content_block=block)
+        await self.session.started.wait()
+        raise ConnectionError("stream dropped")
+
+
+def test_stream_error_cancels_started_tools(monkeypatch):
+    monkeypatch.setattr(tool_dispatch, "STREAM", True)
+
+    async def main():
+        session = SlowSession()
+        client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **params: BrokenStream(session)))
+        messages = [{"role": "user", "content": "q"}]
+        with pytest.raises(ConnectionError):
+            await tool_dispatch.run_turns(client, lambda name: session, [], None, messages)
+        assert session.cancelled
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+
+    asyncio.run(main())
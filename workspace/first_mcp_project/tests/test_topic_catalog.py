@@ -0,0 +1,57 @@
+"""
+Checks for the topic catalog's background watcher.
+
+Run from first_mcp_project: python -m pytest tests/test_topic_catalog.py
+"""
+import time
+
+from paper_store import JSONPaperStore
+from topic_catalog import TopicCatalog
+
+PAPER = {"title": "T", "authors": ["A"], "summary": "s", "pdf_url": "u", "published": "2025-01-01"}
+
+
+def wait_for(condition, timeout=5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_watcher_survives_errors(tmp_path):
+    store = JSONPaperStore(str(tmp_path))
+    store.load()
+    store.add_papers("a", {"p1": PAPER})
+    catalog = TopicCatalog(store, str(tmp_path), rescan_seconds=0.1)
+
+    calls = []
+    list_topics = store.list_topics
+
+    def flaky_list_topics():
+        calls.append(1)
+        if len(calls) in (2, 3):
+            raise OSError("disk went away")
+        return list_topics()
+
+    store.list_topics = flaky_list_topics
+    catalog.start()
+    if catalog._inotify is not None:
+        # 让 inotify 读取也出错一次：线程应改为定期重扫
+        def broken_read():
+            raise OSError("inotify read failed")
+            yield
+
+        catalog._inotify.read = broken_read
+
+    other = JSONPaperStore(str(tmp_path))
+    other.load()
+    other.add_papers("b", {"p2": PAPER})
+    assert wait_for(lambda: "b" in catalog.list_topics())
+    assert catalog._thread.is_alive()
+
+    other.add_papers("c", {"p3": PAPER})
+    assert wait_for(lambda: "c" in catalog.list_topics())
+    assert catalog._thread.is_alive()
+    assert len(calls) > 3
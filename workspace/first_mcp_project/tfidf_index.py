@@ -0,0 +1,231 @@
+import itertools
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from local_search import tokenize
+from paper_store import PaperStore
+from topic_lock import atomic_write
+
+TFIDF_DIR = ".tfidf"
+META_FILE = "meta.json"
+# CSR（按论文取一行）和 CSC（按词取倒排）两份同样的矩阵
+ARRAYS = ("indptr", "indices", "data", "col_ptr", "col_rows", "col_data")
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class TfidfIndex:
+    """
+    TF-IDF matrix over the summaries of all stored papers, for related_papers.
+
+    Rows are L2-normalized, so cosine similarity is a sparse mat-vec. The
+    matrix is kept both row-major (to fetch the query paper's vector) and
+    column-major (to gather only the rows that share a term with it), and
+    scoring is a single np.bincount over the gathered entries.
+
+    Arrays are saved as PAPER_DIR/.tfidf/*.npy and opened with
+    mmap_mode='r', so a restart reuses them without rebuilding. meta.json is
+    written last and records the row order and the store's paper count at
+    build time.
+
+    Writes (mark_dirty) and a stale count on load rebuild the matrix in a
+    background thread; queries keep using the current matrix until the new
+    one is swapped in. Only a query for a stored paper that the current
+    matrix lacks waits for (or runs) a rebuild.
+    """
+
+    def __init__(self, paper_dir: str):
+        self.dir = os.path.join(paper_dir, TFIDF_DIR)
+        # (paper_ids, rows, arrays)，整体替换，读者拿到的引用在一次查询内不变
+        self._matrix: Tuple[List[str], Dict[str, int], Dict[str, np.ndarray]] = ([], {}, {})
+        self.loaded = False
+        # 写入计一代；_built_gen 是当前矩阵已经包含的那一代
+        self._dirty_gen = 0
+        self._built_gen = 0
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def mark_dirty(self, store: PaperStore) -> None:
+        """Called after papers are written; rebuilds the matrix in the background."""
+        with self._lock:
+            self._dirty_gen += 1
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._rebuild_loop, args=(store,), name="tfidf-rebuild", daemon=True
+                )
+                self._worker.start()
+
+    def _rebuild_loop(self, store: PaperStore) -> None:
+        # 重建期间又有写入时再来一轮，直到追上最新的一代
+        while True:
+            with self._lock:
+                if self._built_gen >= self._dirty_gen:
+                    self._worker = None
+                    return
+                gen = self._dirty_gen
+            try:
+                self.build(store)
+            except Exception as e:
+                print(f"Error rebuilding TF-IDF index: {str(e)}", file=sys.stderr)
+                with self._lock:
+                    self._worker = None
+                return
+            with self._lock:
+                self._built_gen = max(self._built_gen, gen)
+
+    def wait(self) -> None:
+        """Block until any background rebuild has finished."""
+        with self._lock:
+            worker = self._worker
+        if worker is not None:
+            worker.join()
+
+    def _load(self) -> Optional[int]:
+        """Map the saved arrays. Returns the paper count they were built from, or None."""
+        try:
+            with open(os.path.join(self.dir, META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = {
+                name: np.load(os.path.join(self.dir, f"{name}.npy"), mmap_mode="r")
+                for name in ARRAYS
+            }
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            return None
+        paper_ids = meta["paper_ids"]
+        self._matrix = (paper_ids, {paper_id: row for row, paper_id in enumerate(paper_ids)}, arrays)
+        return meta["paper_count"]
+
+    def build(self, store: PaperStore) -> None:
+        """Rebuild the matrix from every topic in the store, save it and swap it in."""
+        with self._build_lock:
+            self._build(store)
+
+    def _build(self, store: PaperStore) -> None:
+        # 先取计数再读数据：期间若有写入，下次比较时会发现不一致
+        paper_count = store.paper_count()
+        summaries: Dict[str, List[str]] = {}
+        for topic in store.list_topics():
+            try:
+                papers = store.get_topic_papers(topic) or {}
+            except ValueError as e:
+                print(f"Error indexing topic {topic}: {str(e)}", file=sys.stderr)
+                continue
+            for paper_id, info in papers.items():
+                summaries[paper_id] = tokenize(info.get("summary", ""))
+
+        paper_ids = list(summaries)
+        # 新词的编号就是当时词表的大小，整个映射在 C 层完成
+        vocab: Dict[str, int] = defaultdict()
+        vocab.default_factory = vocab.__len__
+        tokens = np.fromiter(
+            itertools.chain.from_iterable(map(vocab.__getitem__, t) for t in summaries.values()),
+            dtype=np.int64,
+        )
+        lengths = np.fromiter((len(t) for t in summaries.values()), dtype=np.int64, count=len(paper_ids))
+        token_rows = np.repeat(np.arange(len(paper_ids), dtype=np.int64), lengths)
+        width = max(len(vocab), 1)
+
+        # 按 (行, 词) 排序去重，得到的就是 CSR 的顺序和词频
+        keys, counts = np.unique(token_rows * width + tokens, return_counts=True)
+        row_ids = keys // width
+        indices = (keys % width).astype(np.int32)
+        tf = (1 + np.log(counts)).astype(np.float32)
+        indptr = np.zeros(len(paper_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=len(paper_ids)), out=indptr[1:])
+
+        # 平滑 IDF，再按行做 L2 归一化
+        df = np.bincount(indices, minlength=len(vocab))
+        idf = np.log((1 + len(paper_ids)) / (1 + df)) + 1
+        data = tf * idf[indices].astype(np.float32)
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(paper_ids)))
+        norms[norms == 0] = 1
+        data = (data / norms[row_ids]).astype(np.float32)
+
+        order = np.argsort(indices, kind="stable")
+        col_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=col_ptr[1:])
+        arrays = {
+            "indptr": indptr,
+            "indices": indices,
+            "data": data,
+            "col_ptr": col_ptr,
+            "col_rows": row_ids[order].astype(np.int32),
+            "col_data": data[order],
+        }
+
+        os.makedirs(self.dir, exist_ok=True)
+        for name, array in arrays.items():
+            _save_array(os.path.join(self.dir, f"{name}.npy"), array)
+        meta = {"paper_count": paper_count, "paper_ids": paper_ids}
+        atomic_write(os.path.join(self.dir, META_FILE), json.dumps(meta).encode("utf-8"))
+
+        # 旧矩阵的 mmap 指向已被替换掉的文件，正在用它的查询不受影响
+        self._matrix = (paper_ids, {paper_id: row for row, paper_id in enumerate(paper_ids)}, arrays)
+
+    def _ensure_loaded(self, store: PaperStore) -> None:
+        if self.loaded:
+            return
+        with self._build_lock:
+            if self.loaded:
+                return
+            paper_count = self._load()
+            if paper_count is None:
+                # 还没有可用的矩阵，只能当场构建
+                self._build(store)
+            self.loaded = True
+        if paper_count is not None and paper_count != store.paper_count():
+            self.mark_dirty(store)
+
+    def related(self, store: PaperStore, paper_id: str, k: int = 5) -> Optional[List[Tuple[str, float]]]:
+        """
+        Find the stored papers whose summaries are most similar to paper_id's.
+
+        Returns:
+            Up to k (paper_id, cosine similarity) pairs, best first,
+            or None if paper_id is not stored
+        """
+        self._ensure_loaded(store)
+        paper_ids, rows, a = self._matrix
+        row = rows.get(paper_id)
+        if row is None:
+            # 可能是刚写入、后台还没重建进来的论文，或是其他进程写入的论文
+            if store.get_paper(paper_id) is None:
+                return None
+            self.wait()
+            paper_ids, rows, a = self._matrix
+            row = rows.get(paper_id)
+            if row is None:
+                self.build(store)
+                paper_ids, rows, a = self._matrix
+                row = rows.get(paper_id)
+                if row is None:
+                    return None
+        start, end = a["indptr"][row], a["indptr"][row + 1]
+        terms, weights = a["indices"][start:end], a["data"][start:end]
+
+        # 把查询向量各个词的倒排区间拼成一个下标数组，一次性收集
+        starts = a["col_ptr"][terms]
+        lengths = a["col_ptr"][terms + 1] - starts
+        total = int(lengths.sum())
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        contrib = a["col_data"][offsets] * np.repeat(weights, lengths)
+        scores = np.bincount(a["col_rows"][offsets], weights=contrib, minlength=len(paper_ids))
+        scores[row] = -1
+
+        k = min(k, len(paper_ids) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(paper_ids[i], float(scores[i])) for i in top if scores[i] > 0]
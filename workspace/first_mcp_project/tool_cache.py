@@ -0,0 +1,180 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# MCP_TOOL_CACHE=0 关闭客户端的工具结果缓存
+TOOL_CACHE = os.getenv("MCP_TOOL_CACHE", "1") != "0"
+
+# 每个工具的缓存策略：ttl（秒）和 max_entries 表示结果可缓存；
+# invalidates 列出调用成功后要清掉的同一服务器上的缓存（工具名或资源 scheme）。
+# 没有列出的工具一律不缓存。可在 server_config.json 的 "toolCache" 里覆盖或增加。
+DEFAULT_POLICIES: Dict[str, dict] = {
+    "extract_info": {"ttl": 600, "max_entries": 256},
+    "search_local": {"ttl": 120, "max_entries": 64},
+    "related_papers": {"ttl": 120, "max_entries": 64},
+    "recent_topics": {"ttl": 30, "max_entries": 8},
+    "papers://": {"ttl": 60, "max_entries": 64},
+    "search_papers": {
+        "invalidates": ["extract_info", "search_local", "related_papers", "recent_topics", "papers://"],
+    },
+    "search_papers_batch": {
+        "invalidates": ["extract_info", "search_local", "related_papers", "recent_topics", "papers://"],
+    },
+}
+
+
+class ToolCache:
+    """
+    Client-side memo of tool (and resource) results, keyed by
+    (server, tool, canonical arguments).
+
+    Only names with a policy that sets ttl are cached, each in its own LRU
+    bounded by the policy's max_entries. A successful call to a tool whose
+    policy lists invalidates drops those entries for the same server. The
+    server is identified by its session object, which lives as long as the
+    chatbot. Error results are never cached.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, dict]] = None, enabled: bool = TOOL_CACHE):
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # 策略名 -> LRU(key -> (过期时间, 结果))
+        self._entries: Dict[str, "OrderedDict[Tuple, Tuple[float, Any]]"] = {}
+        # 每个服务器的写入代数：调用期间发生过失效，结果就不再写入缓存
+        self._generations: Dict[int, int] = {}
+
+    def _policy_name(self, name: str) -> Optional[str]:
+        if name in self.policies:
+            return name
+        # 资源按 scheme 共用一条策略，例如 papers://folders -> papers://
+        if "://" in name:
+            scheme = name.split("://", 1)[0] + "://"
+            if scheme in self.policies:
+                return scheme
+        return None
+
+    @staticmethod
+    def make_key(session: Any, name: str, arguments: Optional[dict]) -> Tuple:
+        # 参数按键排序后序列化，{"a":1,"b":2} 和 {"b":2,"a":1} 命中同一条
+        return (id(session), name, json.dumps(arguments or {}, sort_keys=True, ensure_ascii=False, default=str))
+
+    def generation(self, session: Any) -> int:
+        """Call before issuing a request; pass the value back to put()."""
+        return self._generations.get(id(session), 0)
+
+    def get(self, session: Any, name: str, arguments: Optional[dict] = None) -> Optional[Any]:
+        """Return the cached result of a call, or None on a miss or expired entry."""
+        policy_name = self._policy_name(name)
+        if not self.enabled or policy_name is None or not self.policies[policy_name].get("ttl"):
+            return None
+        entries = self._entries.get(policy_name)
+        key = self.make_key(session, name, arguments)
+        entry = entries.get(key) if entries is not None else None
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del entries[key]
+            self.misses += 1
+            return None
+        entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(
+        self,
+        session: Any,
+        name: str,
+        arguments: Optional[dict],
+        result: Any,
+        generation: int,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Record the result of a call that went to the server.
+
+        Args:
+            session: The session the call was sent to
+            name: Tool name, or resource URI
+            arguments: The tool arguments (None for resources)
+            result: The result to cache
+            generation: Value of generation(session) taken before the call
+            ttl: Overrides the policy's ttl, e.g. math.inf for a subscribed
+                resource that is only dropped through discard()
+        """
+        policy_name = self._policy_name(name)
+        if not self.enabled or policy_name is None:
+            return
+        policy = self.policies[policy_name]
+        if getattr(result, "isError", False):
+            return
+        if policy.get("invalidates"):
+            self.invalidate(session, policy["invalidates"])
+        ttl = policy.get("ttl") if ttl is None else ttl
+        if not ttl or generation != self.generation(session):
+            return
+        entries = self._entries.setdefault(policy_name, OrderedDict())
+        key = self.make_key(session, name, arguments)
+        entries[key] = (time.monotonic() + ttl, result)
+        entries.move_to_end(key)
+        while len(entries) > policy.get("max_entries", 128):
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, session: Any, names=None) -> int:
+        """
+        Drop the cached results of one server, for the given policy names
+        (tool names or resource schemes) or all of them. Returns the number
+        of entries dropped.
+        """
+        self._generations[id(session)] = self.generation(session) + 1
+        dropped = 0
+        for policy_name in (self._entries if names is None else names):
+            entries = self._entries.get(policy_name)
+            if not entries:
+                continue
+            for key in [key for key in entries if key[0] == id(session)]:
+                del entries[key]
+                dropped += 1
+        self.invalidations += dropped
+        return dropped
+
+    def discard(self, session: Any, name: str, arguments: Optional[dict] = None) -> bool:
+        """Drop the cached result of one call (e.g. a resource the server reported as updated)."""
+        self._generations[id(session)] = self.generation(session) + 1
+        policy_name = self._policy_name(name)
+        entries = self._entries.get(policy_name) if policy_name is not None else None
+        if entries is None or entries.pop(self.make_key(session, name, arguments), None) is None:
+            return False
+        self.invalidations += 1
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and entry counts per policy."""
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": {name: len(entries) for name, entries in self._entries.items() if entries},
+        }
+
+    def print_stats(self) -> None:
+        stats = self.stats()
+        print(
+            f"\nTool cache ({'on' if stats['enabled'] else 'off'}): {stats['hits']} hits, "
+            f"{stats['misses']} misses, hit rate {stats['hit_rate']:.0%}, "
+            f"{stats['evictions']} evictions, {stats['invalidations']} invalidated"
+        )
+        for name, count in stats["entries"].items():
+            print(f"  {name:<20} {count} entries")
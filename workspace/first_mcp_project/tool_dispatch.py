@@ -0,0 +1,177 @@
+import asyncio
+import os
+from typing import Any, Callable, List, Optional
+
+from context_budget import ContextBudget
+from llm_stream import STREAM, stream_message
+from prompt_cache import CacheUsage, with_cache_breakpoints
+from tool_cache import ToolCache
+
+# 同一轮里最多同时执行的工具调用数
+TOOL_CONCURRENCY = int(os.getenv("MCP_TOOL_CONCURRENCY", "4"))
+
+
+class ToolRunner:
+    """
+    Starts tool calls as soon as their tool_use block is known and collects
+    the results in the order they were started.
+
+    All calls share one semaphore, so at most max_concurrency run at once.
+    Used directly when streaming (a tool can start while the rest of the
+    response is still arriving) and through call_tools() otherwise. With a
+    ToolCache, cached results are returned without a server round trip.
+    """
+
+    def __init__(
+        self,
+        get_session: Callable[[str], Optional[Any]],
+        max_concurrency: int = TOOL_CONCURRENCY,
+        cache: Optional[ToolCache] = None,
+    ):
+        self.get_session = get_session
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._tasks: List[asyncio.Task] = []
+
+    async def _run(self, tool_use) -> dict:
+        session = self.get_session(tool_use.name)
+        if session is None:
+            print(f"Tool {tool_use.name} not found in sessions")
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": f"Tool {tool_use.name} not found",
+                "is_error": True,
+            }
+        result = self.cache.get(session, tool_use.name, tool_use.input) if self.cache is not None else None
+        if result is not None:
+            print(f"Using cached result of {tool_use.name} with args {tool_use.input}")
+        else:
+            generation = self.cache.generation(session) if self.cache is not None else 0
+            async with self._semaphore:
+                print(f"Calling tool {tool_use.name} with args {tool_use.input}")
+                try:
+                    result = await session.call_tool(tool_use.name, arguments=tool_use.input)
+                except Exception as e:
+                    # 一个工具失败不影响同一轮的其他调用，把错误交给模型处理
+                    return {
+                        "type": "tool_result",
+                        "tool_use_id": tool_use.id,
+                        "content": f"Error calling tool {tool_use.name}: {e}",
+                        "is_error": True,
+                    }
+            if self.cache is not None:
+                self.cache.put(session, tool_use.name, tool_use.input, result, generation)
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_use.id,
+            "content": result.content,
+            "is_error": bool(result.isError),
+        }
+
+    def start(self, tool_use) -> None:
+        """Schedule one tool_use block without waiting for it."""
+        self._tasks.append(asyncio.create_task(self._run(tool_use)))
+
+    async def results(self) -> List[dict]:
+        """Wait for every started call; one tool_result block per call, in start order."""
+        tasks, self._tasks = self._tasks, []
+        return list(await asyncio.gather(*tasks))
+
+    async def cancel(self) -> None:
+        """Cancel every started call and wait until they have all finished."""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def call_tools(
+    tool_uses: List[Any],
+    get_session: Callable[[str], Optional[Any]],
+    max_concurrency: int = TOOL_CONCURRENCY,
+    cache: Optional[ToolCache] = None,
+) -> List[dict]:
+    """
+    Run every tool_use block of one assistant turn concurrently.
+
+    Args:
+        tool_uses: The tool_use content blocks, in the order the model sent them
+        get_session: Maps a tool name to the session that serves it (None if unknown)
+        max_concurrency: Maximum number of calls in flight at once
+        cache: Optional client-side result cache
+
+    Returns:
+        One tool_result block per tool_use, in the same order, ready to be sent
+        back together in a single user message
+    """
+    runner = ToolRunner(get_session, max_concurrency, cache)
+    for tool_use in tool_uses:
+        runner.start(tool_use)
+    return await runner.results()
+
+
+async def run_turns(
+    anthropic,
+    get_session: Callable[[str], Optional[Any]],
+    tools: List[dict],
+    tool_cache: Optional[ToolCache],
+    messages: List[dict],
+    model: str = "deepseek-chat",
+    max_tokens: int = 2024,
+) -> None:
+    """
+    Run one query's model/tool loop until the model answers without tools.
+
+    Each turn sends the conversation (old tool results elided by a
+    ContextBudget, cache breakpoints on the tools and the last message),
+    starts the tool calls as soon as they are known and appends the
+    assistant message and the combined tool results to messages. Prints the
+    context and prompt-cache reports at the end.
+
+    Args:
+        anthropic: AsyncAnthropic client
+        get_session: Maps a tool name to the session that serves it (None if unknown)
+        tools: Tool definitions exposed to the model
+        tool_cache: Optional client-side result cache
+        messages: The conversation so far; extended in place
+        model: Model name
+        max_tokens: Maximum tokens per response
+    """
+    # 旧的工具结果超出预算时裁掉，只影响发送内容，不改 messages 本身
+    context = ContextBudget()
+    usage = CacheUsage()
+
+    while True:
+        # 同一轮的工具调用并发执行，结果放进一条 user 消息，再只请求一次模型
+        runner = ToolRunner(get_session, cache=tool_cache)
+        # 工具定义和已有对话作为可缓存前缀，只有新的一轮需要重新处理
+        request_tools, request_messages = with_cache_breakpoints(tools, context.prepare(messages))
+        params = dict(max_tokens=max_tokens, model=model, tools=request_tools, messages=request_messages)
+        try:
+            if STREAM:
+                # 工具在其参数流完时就开始执行，不等整条响应结束
+                response = await stream_message(anthropic, runner.start, **params)
+            else:
+                response = await anthropic.messages.create(**params)
+                for content in response.content:
+                    if content.type == "text":
+                        print(content.text)
+                    elif content.type == "tool_use":
+                        runner.start(content)
+        except BaseException:
+            # 流在中途断开时，已经开始的工具调用不能留在后台继续跑
+            await runner.cancel()
+            raise
+        usage.add(response.usage)
+        messages.append({"role": "assistant", "content": response.content})
+
+        # Exit loop if no tool was used
+        if not any(content.type == "tool_use" for content in response.content):
+            break
+
+        tool_results = await runner.results()
+        messages.append({"role": "user", "content": tool_results})
+
+    context.report()
+    usage.report()
@@ -0,0 +1,245 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from paper_index import LOG_FILE, PAPERS_FILE
+from paper_store import JSONPaperStore, PaperStore
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+ROOT_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+TOPIC_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Minimal ctypes wrapper around the Linux inotify API."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read(self):
+        """Yield (wd, mask, name) for every queued event."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            yield wd, mask, os.fsdecode(name)
+            offset += _EVENT.size + length
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class TopicCatalog:
+    """
+    In-memory catalog of topics with their paper counts and last update times.
+
+    Built once from the store, then kept current by a background thread:
+    with the JSON backend on Linux it watches PAPER_DIR and every topic
+    directory with inotify and re-reads only the topics that changed;
+    otherwise (other platforms, SQLite backend, inotify unavailable) it
+    rescans every rescan_seconds. Writes made by this process are applied
+    immediately through update(). Readers never touch the disk. Listeners
+    registered with add_listener() are called with the topic name whenever a
+    topic is added, changed or removed, from whichever thread noticed it.
+    """
+
+    def __init__(self, store: PaperStore, paper_dir: str, rescan_seconds: float = 30):
+        self.store = store
+        self.paper_dir = paper_dir
+        self.rescan_seconds = rescan_seconds
+        self.topics: Dict[str, dict] = {}  # topic -> {"papers": int, "updated": float}
+        self.generation = 0  # 每次目录内容变化加一，供渲染缓存做版本号
+        self.built = False
+        self.watching = False
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, str] = {}  # wd -> topic ("" 表示 PAPER_DIR 本身)
+        self._watched: Set[str] = set()
+        self._watch_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+    # ---- catalog contents ----
+
+    def update(self, topic: str) -> None:
+        """Re-read one topic from the store (call after writing to it)."""
+        try:
+            summary = self.store.topic_summary(topic)
+        except (OSError, ValueError) as e:
+            print(f"Error reading topic {topic}: {str(e)}", file=sys.stderr)
+            return
+        with self._lock:
+            entry = {"papers": summary[0], "updated": summary[1]} if summary is not None else None
+            if self.topics.get(topic) == entry:
+                return
+            if entry is None:
+                del self.topics[topic]
+            else:
+                self.topics[topic] = entry
+            self.generation += 1
+        if entry is not None and self._inotify is not None:
+            self._watch_topic(topic)
+        for listener in self._listeners:
+            try:
+                listener(topic)
+            except Exception as e:
+                print(f"Topic listener failed for {topic}: {str(e)}", file=sys.stderr)
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call listener(topic) after every change to a topic's entry."""
+        self._listeners.append(listener)
+
+    def rescan(self) -> None:
+        """Rebuild the catalog from a full listing of the store."""
+        on_disk = set(self.store.list_topics())
+        with self._lock:
+            known = set(self.topics)
+        for topic in on_disk | known:
+            self.update(topic)
+        self.built = True
+
+    def _ensure_built(self) -> None:
+        if not self.built:
+            self.rescan()
+
+    def list_topics(self) -> List[str]:
+        """Topic names, most recently updated first."""
+        self._ensure_built()
+        with self._lock:
+            return sorted(self.topics, key=lambda topic: self.topics[topic]["updated"], reverse=True)
+
+    def get(self, topic: str) -> Optional[dict]:
+        self._ensure_built()
+        with self._lock:
+            entry = self.topics.get(topic)
+            return dict(entry) if entry is not None else None
+
+    def updated_since(self, since: float) -> Dict[str, dict]:
+        """Topics updated at or after the given UNIX time."""
+        self._ensure_built()
+        with self._lock:
+            return {topic: dict(entry) for topic, entry in self.topics.items() if entry["updated"] >= since}
+
+    # ---- background watcher ----
+
+    def _watch_topic(self, topic: str) -> None:
+        with self._watch_lock:
+            if self._inotify is None or topic in self._watched:
+                return
+            try:
+                wd = self._inotify.add_watch(os.path.join(self.paper_dir, topic), TOPIC_MASK)
+            except OSError as e:
+                # 例如超过 max_user_watches：这个主题只能依赖定期重扫
+                print(f"Cannot watch topic {topic}: {str(e)}", file=sys.stderr)
+                return
+            self._watches[wd] = topic
+            self._watched.add(topic)
+
+    def start(self) -> None:
+        """Build the catalog and start the background watcher thread."""
+        if self._thread is not None:
+            return
+        if sys.platform.startswith("linux") and isinstance(self.store, JSONPaperStore):
+            try:
+                os.makedirs(self.paper_dir, exist_ok=True)
+                self._inotify = _Inotify()
+                self._watches[self._inotify.add_watch(self.paper_dir, ROOT_MASK)] = ""
+                self.watching = True
+            except (OSError, AttributeError) as e:
+                print(f"inotify unavailable, falling back to periodic rescans: {str(e)}", file=sys.stderr)
+                self._inotify = None
+        self.rescan()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        last_rescan = time.monotonic()
+        while True:
+            try:
+                if self._inotify is None:
+                    time.sleep(self.rescan_seconds)
+                    self.rescan()
+                else:
+                    last_rescan = self._poll(last_rescan)
+            except Exception as e:
+                # 监视线程不能悄悄退出：记下错误，之后只靠定期重扫
+                print(f"Topic watcher failed, falling back to periodic rescans: {str(e)}", file=sys.stderr)
+                self._stop_watching()
+
+    def _stop_watching(self) -> None:
+        with self._watch_lock:
+            inotify, self._inotify = self._inotify, None
+            self._watches.clear()
+            self._watched.clear()
+            self.watching = False
+        if inotify is not None:
+            try:
+                inotify.close()
+            except OSError:
+                pass
+
+    def _poll(self, last_rescan: float) -> float:
+        """Wait for inotify events and apply them. Returns the time of the last full rescan."""
+        ready, _, _ = select.select([self._inotify.fd], [], [], self.rescan_seconds)
+        dirty: Set[str] = set()
+        overflow = False
+        if ready:
+            # 写入通常是一连串事件（追加、临时文件、rename），稍等片刻一起处理
+            time.sleep(0.05)
+            for wd, mask, name in self._inotify.read():
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif mask & IN_IGNORED:
+                    with self._watch_lock:
+                        self._watched.discard(self._watches.pop(wd, None))
+                elif self._watches.get(wd) == "":
+                    if mask & IN_ISDIR and not name.startswith("."):
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            # 先挂上监视再读取，主题文件随后创建也不会漏掉
+                            self._watch_topic(name)
+                        dirty.add(name)
+                elif wd in self._watches and name in (PAPERS_FILE, LOG_FILE, ""):
+                    dirty.add(self._watches[wd])
+        # 即使有 inotify 也定期全量核对一次，防止漏掉事件
+        if overflow or time.monotonic() - last_rescan >= self.rescan_seconds:
+            last_rescan = time.monotonic()
+            self.rescan()
+            return last_rescan
+        for topic in dirty:
+            self.update(topic)
+        return last_rescan
@@ -0,0 +1,96 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 上没有 fcntl，只能保证同一进程内的互斥
+    fcntl = None
+
+LOCK_DIR = ".locks"
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Write a file via a unique temp file and os.replace, so readers see either
+    the old or the new content and never a truncated file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _TopicLock:
+    """Reentrant per-topic lock: a thread RLock plus an flock held by the outermost owner."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mutex = threading.RLock()
+        self.depth = 0
+        self.fd = None
+
+    def acquire(self) -> None:
+        self.mutex.acquire()
+        if self.depth == 0 and fcntl is not None:
+            # 同一进程里对同一文件再次 flock 会自锁，所以只在最外层加锁
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self.fd is not None:
+                    os.close(self.fd)
+                    self.fd = None
+                self.mutex.release()
+                raise
+        self.depth += 1
+
+    def release(self) -> None:
+        self.depth -= 1
+        if self.depth == 0 and self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        self.mutex.release()
+
+
+class TopicLockManager:
+    """
+    Exclusive per-topic locks that work across threads and processes.
+
+    Locks on different topics never contend with each other; the topic ->
+    lock table is split into shards so creating a lock only briefly takes
+    that shard's mutex. Cross-process exclusion uses fcntl.flock on
+    PAPER_DIR/.locks/<topic>.lock where available.
+    """
+
+    def __init__(self, paper_dir: str, shards: int = 16):
+        self.lock_dir = os.path.join(paper_dir, LOCK_DIR)
+        self._shards = [(threading.Lock(), {}) for _ in range(shards)]
+
+    def _get(self, topic: str) -> _TopicLock:
+        mutex, table = self._shards[hash(topic) % len(self._shards)]
+        with mutex:
+            lock = table.get(topic)
+            if lock is None:
+                lock = _TopicLock(os.path.join(self.lock_dir, topic + ".lock"))
+                table[topic] = lock
+            return lock
+
+    @contextmanager
+    def lock(self, topic: str):
+        """Hold the exclusive lock for a topic. Reentrant within a thread."""
+        topic_lock = self._get(topic)
+        topic_lock.acquire()
+        try:
+            yield
+        finally:
+            topic_lock.release()